@@ -9,7 +9,7 @@ from tastypie.authorization import Authorization
 from tastypie.bundle import Bundle
 from tastypie.constants import ALL, ALL_WITH_RELATIONS
 from tastypie.exceptions import ImmediateHttpResponse
-from tastypie.fields import DictField, ListField, CharField, ToManyField, ForeignKey
+from tastypie.fields import BooleanField, DictField, FloatField, ListField, CharField, ToManyField, ForeignKey
 from tastypie.resources import ModelResource
 from tastypie.utils import trailing_slash
 
@@ -43,10 +43,13 @@ class UploadedLayerResource(ModelResource):
     layer_name = CharField(attribute='layer_name', readonly=True)
     error_message = CharField(attribute='import_error', null=True, readonly=True)
     traceback_message = CharField(attribute='import_full_error', null=True, readonly=True)
+    import_progress = FloatField(attribute='import_progress', null=True, readonly=True)
+    feature_count_estimated = BooleanField(attribute='feature_count_estimated', readonly=True)
 
     class Meta:
         queryset = UploadLayer.objects.all()
         resource_name = 'data-layers'
+        excludes = ['import_checkpoint']
         allowed_methods = ['get']
         filtering = {'id': ALL}
         authentication = SessionAuthentication()
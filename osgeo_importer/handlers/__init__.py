@@ -73,38 +73,85 @@ class FieldConverterHandler(GetModifiedFieldsMixin, ImportHandlerMixin):
     """
     field_converter = OGRFieldConverter
 
-    def convert_field_to_time(self, layer, field):
+    def __init__(self, importer, *args, **kwargs):
+        super(FieldConverterHandler, self).__init__(importer, *args, **kwargs)
+        self.conversion_stats = {}
+
+    def get_connection_string(self):
         d = db.connections[settings.OSGEO_DATASTORE].settings_dict
-        connection_string = "PG:dbname='%s' user='%s' password='%s' host='%s' port='%s' schemas=%s" % (
+        return "PG:dbname='%s' user='%s' password='%s' host='%s' port='%s' schemas=%s" % (
             d['NAME'], d['USER'],
             d['PASSWORD'], d['HOST'],
             d['PORT'],
             database_schema_name())
 
-        with self.field_converter(connection_string) as datasource:
-            return datasource.convert_field(layer, field)
+    def convert_field_to_time(self, layer, field):
+        return self.convert_fields_to_time(layer, [field])[field]
+
+    def convert_fields_to_time(self, layer, fields):
+        """
+        Converts the fields with a single datasource, returning a {field: new column} dict.  Field converters with
+        a convert_fields method convert the fields together in one transaction, if that fails each field is
+        converted on its own so a field that can't be converted doesn't roll back the others.  Fields that can't be
+        converted are logged and left out of the result, unless only one field was given.
+        """
+        with self.field_converter(self.get_connection_string()) as datasource:
+            if hasattr(datasource, 'convert_fields'):
+                try:
+                    return self.convert_fields_with(datasource, layer, fields)
+                except Exception:
+                    if len(fields) < 2:
+                        raise
+                    logging.exception('Error while converting values of {!r} together, converting them one at a '
+                                      'time.'.format(fields))
+
+            new_cols = {}
+            for field in fields:
+                try:
+                    new_cols.update(self.convert_fields_with(datasource, layer, [field]))
+                except Exception:
+                    if len(fields) < 2:
+                        raise
+                    logging.exception('Error while converting values of {!r}'.format(field))
+            return new_cols
+
+    def convert_fields_with(self, datasource, layer, fields):
+        """
+        Converts the fields with a field converter, recording the conversion statistics it reports.
+        """
+        if hasattr(datasource, 'convert_fields'):
+            new_cols = datasource.convert_fields(layer, fields)
+        else:
+            new_cols = dict((field, datasource.convert_field(layer, field)) for field in fields)
+
+        self.conversion_stats.update(getattr(datasource, 'conversion_stats', None) or {})
+        return new_cols
 
     @ensure_can_run
     def handle(self, layer, layer_config, *args, **kwargs):
+        """
+        Converts the layer's convert_to_date fields, returning the conversion statistics of each field when the
+        field converter reports them.
+        """
         self.update_date_attributes(layer_config)
+        self.conversion_stats = {}
+        fields_to_convert = [field for field in set(layer_config.get('convert_to_date', [])) if field]
 
         try:
-            for field_to_convert in set(layer_config.get('convert_to_date', [])):
-
-                if not field_to_convert:
-                    continue
-
-                new_col = self.convert_field_to_time(layer, field_to_convert)
+            if fields_to_convert:
+                new_cols = self.convert_fields_to_time(layer, fields_to_convert)
 
                 # if the start_date or end_date needed to be converted to a date
                 # field, use the newly created field name/
                 for date_option in ('start_date', 'end_date'):
-                    if layer_config.get(date_option) == field_to_convert:
-                        layer_config[date_option] = new_col.lower()
+                    if layer_config.get(date_option) in new_cols:
+                        layer_config[date_option] = new_cols[layer_config[date_option]].lower()
 
         except Exception:
             logging.exception(
-                "Error while converting value {!r}".format(field_to_convert))
+                "Error while converting values of {!r}".format(fields_to_convert))
+
+        return self.conversion_stats or None
 
 
 class BigDateFieldConverterHandler(FieldConverterHandler):
@@ -15,6 +15,8 @@ from osgeo_importer.utils import increment_filename, database_schema_name
 import re
 
 logger = logging.getLogger(__name__)
+# Keeps connections to GeoServer's GeoGig endpoints alive between requests.
+http_session = requests.Session()
 
 
 def ensure_workspace_exists(catalog, workspace_name, workspace_namespace_uri):
@@ -36,12 +38,60 @@ def configure_time(resource, name='time', enabled=True, presentation='LIST', res
     return resource.catalog.save(resource)
 
 
+class CatalogSession(object):
+    """
+    Shares the GeoServer layers fetched during an import between handlers, a layer is fetched again after a handler
+    changes it.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.layers = {}
+
+    def get_layer(self, name, refresh=False):
+        """
+        Returns the GeoServer layer, fetching it if it wasn't fetched since it last changed.
+        """
+        if refresh:
+            self.invalidate(name)
+
+        if self.layers.get(name) is None:
+            self.layers[name] = self.catalog.get_layer(name)
+
+        return self.layers[name]
+
+    def invalidate(self, name):
+        """
+        Forgets the layer and the responses about it cached by the catalog.
+        """
+        self.layers.pop(name, None)
+        segment = re.compile(r'/{}(\.\w+)?(/|$)'.format(re.escape(name.split(':')[-1])))
+        cache = getattr(self.catalog, '_cache', {})
+        for url in list(cache):
+            if segment.search(url.split('?')[0]):
+                cache.pop(url, None)
+
+
 class GeoserverHandlerMixin(ImportHandlerMixin):
     """
     A Mixin for Geoserver handlers.
     """
     catalog = gs_catalog
 
+    @property
+    def catalog_session(self):
+        """
+        The CatalogSession shared by the GeoServer handlers of the importer.
+        """
+        owner = self if self.importer is None else self.importer
+        session = getattr(owner, 'geoserver_catalog_session', None)
+
+        if session is None:
+            session = CatalogSession(self.catalog)
+            owner.geoserver_catalog_session = session
+
+        return session
+
 
 class GeoServerTimeHandler(GetModifiedFieldsMixin, GeoserverHandlerMixin):
     """
@@ -71,10 +121,11 @@ class GeoServerTimeHandler(GetModifiedFieldsMixin, GeoserverHandlerMixin):
         "end_date" (optional): Passed as the end attribute to Geoserver.
         """
 
-        lyr = self.catalog.get_layer(layer)
+        lyr = self.catalog_session.get_layer(layer)
         self.update_date_attributes(layer_config)
         configure_time(lyr.resource, attribute=layer_config.get('start_date'),
                        end_attribute=layer_config.get('end_date'))
+        self.catalog_session.invalidate(layer)
 
 
 class GeoserverPublishHandler(GeoserverHandlerMixin):
@@ -200,7 +251,7 @@ class GeoserverPublishHandler(GeoserverHandlerMixin):
         repo = store.name
         repo_url = self.catalog.service_url.replace('/rest', '/geogig/repos/{0}/'.format(repo))
         transaction_url = repo_url + 'beginTransaction.json'
-        transaction = requests.get(transaction_url, **request_params)
+        transaction = http_session.get(transaction_url, **request_params)
 
         if request_user is not None:
             author_name = request_user.get('username', None)
@@ -230,20 +281,21 @@ class GeoserverPublishHandler(GeoserverHandlerMixin):
           'transactionId': transaction_id
         }
 
-        import_command = requests.get(repo_url + 'postgis/import.json', params=params, **request_params)
+        import_command = http_session.get(repo_url + 'postgis/import.json', params=params, **request_params)
         task = import_command.json()['task']
 
         status = 'NOT RUN'
         while status != 'FINISHED':
-            check_task = requests.get(task['href'], **request_params)
+            check_task = http_session.get(task['href'], **request_params)
             status = check_task.json()['task']['status']
 
         if status == 'FINISHED':
-            requests.get(repo_url + 'add.json', params={'transactionId': transaction_id}, **request_params)
-            requests.get(repo_url + 'commit.json', params={'transactionId': transaction_id,
+            http_session.get(repo_url + 'add.json', params={'transactionId': transaction_id}, **request_params)
+            http_session.get(repo_url + 'commit.json', params={'transactionId': transaction_id,
                                                            'authorName': author_name,
                                                            'authorEmail': author_email}, **request_params)
-            requests.get(repo_url + 'endTransaction.json', params={'transactionId': transaction_id}, **request_params)
+            http_session.get(repo_url + 'endTransaction.json', params={'transactionId': transaction_id},
+                             **request_params)
 
     @ensure_can_run
     def handle(self, layer, layer_config, *args, **kwargs):
@@ -264,8 +316,9 @@ class GeoserverPublishHandler(GeoserverHandlerMixin):
         if store_type.lower() == 'geogig':
             self.geogig_handler(store, layer, layer_config, request_user)
 
-        return self.catalog.publish_featuretype(layer, store,
-                                                layer_config.get('srs', self.srs))
+        featuretype = self.catalog.publish_featuretype(layer, store, layer_config.get('srs', self.srs))
+        self.catalog_session.invalidate(layer)
+        return featuretype
 
     def geogig_version(self):
         """
@@ -274,7 +327,7 @@ class GeoserverPublishHandler(GeoserverHandlerMixin):
         version_url = "{}/about/manifest.json".format(self.catalog.service_url)
         version = 1.0
         try:
-            resp = requests.get(version_url, auth=(self.catalog.username, self.catalog.password))
+            resp = http_session.get(version_url, auth=(self.catalog.username, self.catalog.password))
             for dep in resp.json()['about']['resource']:
                 if 'geogig-api' in dep['@name']:
                     version = dep['Implementation-Version']
@@ -329,6 +382,7 @@ class GeoserverPublishCoverageHandler(GeoserverHandlerMixin):
         except AttributeError:
             resp = self.catalog.create_coveragestore(name, path=layer_path, workspace=workspace,
                                                      layer_name=name, upload_data=UPLOAD_RASTER)
+        self.catalog_session.invalidate(name)
 
         return resp
 
@@ -380,7 +434,7 @@ class GeoWebCacheHandler(GeoserverHandlerMixin):
         """
         Only run this handler if the layer is found in Geoserver.
         """
-        self.layer = self.catalog.get_layer(layer)
+        self.layer = self.catalog_session.get_layer(layer)
 
         if self.layer:
             return True
@@ -446,8 +500,7 @@ class GeoServerBoundsHandler(GeoserverHandlerMixin):
         """
         Only run this handler if the layer is found in Geoserver.
         """
-        self.catalog._cache.clear()
-        self.layer = self.catalog.get_layer(layer)
+        self.layer = self.catalog_session.get_layer(layer)
 
         if self.layer:
             return True
@@ -464,6 +517,7 @@ class GeoServerBoundsHandler(GeoserverHandlerMixin):
         except InvalidOperation:
             resource.latlon_bbox = ['-180', '180', '-90', '90', 'EPSG:4326']
             self.catalog.save(resource)
+            self.catalog_session.invalidate(layer)
 
 
 class GenericSLDHandler(GeoserverHandlerMixin):
@@ -475,8 +529,7 @@ class GenericSLDHandler(GeoserverHandlerMixin):
         """
         Only run this handler if the layer is found in Geoserver and the layer's style is one of the default styles.
         """
-        self.catalog._cache.clear()
-        self.layer = self.catalog.get_layer(layer)
+        self.layer = self.catalog_session.get_layer(layer)
 
         if self.layer:
             if self.layer.default_style:
@@ -528,14 +581,13 @@ class GenericSLDHandler(GeoserverHandlerMixin):
             if style:
                 self.layer.default_style = style
                 self.catalog.save(self.layer)
+                self.catalog_session.invalidate(layer)
                 save_style(style)
 
 
 class GeoServerStyleHandler(GeoserverHandlerMixin):
     """Adds styles to GeoServer Layer
     """
-    catalog = gs_catalog
-    catalog._cache.clear()
     workspace = 'geonode'
 
     def can_run(self, layer, layer_config, *args, **kwargs):
@@ -554,7 +606,8 @@ class GeoServerStyleHandler(GeoserverHandlerMixin):
         "default_sld": SLD to load as default_sld
         "slds": SLDS to add to layer
         """
-        lyr = self.catalog.get_layer(layer)
+        # The GeoNode publish handler runs before this one and may have changed the layer's styles.
+        lyr = self.catalog_session.get_layer(layer, refresh=True)
         path = os.path.join(UPLOAD_DIR, str(self.importer.upload_file.upload.id))
         default_sld = layer_config.get('default_style', None)
         slds = layer_config.get('styles', None)
@@ -598,4 +651,5 @@ class GeoServerStyleHandler(GeoserverHandlerMixin):
             lyr.default_style = default_style
             response = {'default_style': default_style.filename}
         self.catalog.save(lyr)
+        self.catalog_session.invalidate(layer)
         return response
@@ -1,37 +1,170 @@
 """ This code originated from
     https://github.com/terranodo/mapproxy/blob/addGeopackageAutoconfig/mapproxy/script/conf/geopackage.py
 """
+from contextlib import contextmanager
+import fcntl
 from logging import getLogger
 import yaml
 import sqlite3
 import os
+import tempfile
 
 logger = getLogger(__name__)
 
 
+def merge_mapproxy_yaml(single_yaml, yaml_dict, layer_index=None, merge_dict_keys=('grids', 'caches', 'services')):
+    """ Merges the *merge_dict_keys* dictionaries and layers of *yaml_dict* into *single_yaml*, a layer replaces the
+        one with the same name.  *layer_index* maps layer names to positions in single_yaml['layers'], pass the same
+        dict when merging many documents to avoid rebuilding it.
+    """
+    for merge_key in merge_dict_keys:
+        try:
+            single_yaml.setdefault(merge_key, {}).update(yaml_dict[merge_key])
+        except KeyError:
+            logger.warn('Did not find key "{}" in yaml config'.format(merge_key))
+
+    layers = single_yaml.setdefault('layers', [])
+    if layer_index is None:
+        layer_index = dict((layer.get('name'), i) for i, layer in enumerate(layers))
+
+    try:
+        for layer in yaml_dict['layers']:
+            name = layer.get('name')
+            if name in layer_index:
+                layers[layer_index[name]] = layer
+            else:
+                layer_index[name] = len(layers)
+                layers.append(layer)
+    except KeyError:
+        logger.warn('Did not find key "layers" in yaml config')
+
+    return single_yaml
+
+
 def combine_mapproxy_yaml(yaml_dict_list):
     """ Returns a single yaml config document with the contents of each of these dictionaries
         from each yaml document in *yaml_list* merged:
             caches, grids, layers, services
     """
     single_yaml = {'grids': {}, 'caches': {}, 'services': {}, 'layers': []}
-    merge_dict_keys = ['grids', 'caches', 'services']
+    layer_index = {}
     for yaml_dict in yaml_dict_list:
-        for merge_key in merge_dict_keys:
-            try:
-                for key, item in yaml_dict[merge_key].items():
-                    single_yaml[merge_key][key] = item
-            except KeyError:
-                logger.warn('Did not find key "{}" in yaml config'.format(merge_key))
+        merge_mapproxy_yaml(single_yaml, yaml_dict, layer_index)
+
+    return single_yaml
+
 
+@contextmanager
+def locked(path):
+    """ Holds an exclusive lock on *path*.lock, serializing updates of *path* between processes.
+    """
+    with open('{}.lock'.format(path), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
         try:
-            for layer in yaml_dict['layers']:
-                if layer not in single_yaml['layers']:
-                    single_yaml['layers'].append(layer)
-        except KeyError:
-            logger.warn('Did not find key "layers" in yaml config')
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
-    return single_yaml
+
+def write_atomically(path, content):
+    """ Writes *content* to a temporary file next to *path* and renames it over *path*, so readers such as MapProxy
+        never see a partially written file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.{}'.format(
+        os.path.basename(path)))
+    renamed = False
+    try:
+        try:
+            temp_file = os.fdopen(fd, 'w')
+        except Exception:
+            os.close(fd)
+            raise
+        with temp_file:
+            temp_file.write(content)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.chmod(temp_path, 0o644)
+        os.rename(temp_path, path)
+        renamed = True
+    finally:
+        if not renamed:
+            os.remove(temp_path)
+
+
+def get_fragment_path(config_path, name):
+    """ Returns the path of the fragment *name* of the MapProxy config at *config_path*, e.g. geonode.d/name.yaml
+    """
+    return os.path.join('{}.d'.format(os.path.splitext(config_path)[0]), '{}.yaml'.format(name))
+
+
+def add_fragment_to_index(index, config_path, name, yaml_dict):
+    """ References the fragment *name* holding *yaml_dict* from *index*, the yaml document of the config file.
+        MapProxy merges the grids and caches of 'base' files but not their layer lists, so the index lists the layers.
+    """
+    base = os.path.relpath(get_fragment_path(config_path, name), os.path.dirname(os.path.abspath(config_path)))
+    if base not in index.setdefault('base', []):
+        index['base'].append(base)
+    merge_mapproxy_yaml(index, yaml_dict, merge_dict_keys=['services'])
+
+
+def write_fragment(config_path, name, yaml_dict):
+    fragment_path = get_fragment_path(config_path, name)
+    if not os.path.isdir(os.path.dirname(fragment_path)):
+        os.makedirs(os.path.dirname(fragment_path))
+    write_atomically(fragment_path, yaml.dump(yaml_dict))
+
+
+def add_mapproxy_fragment(config_path, name, yaml_dict, initial_fragments=None):
+    """ Writes *yaml_dict* to its own fragment file and references it from the MapProxy config at *config_path*,
+        only that fragment and the small index file are written.
+        :param initial_fragments: Callable returning the (name, yaml document) pairs to write when the config file
+            doesn't exist yet.
+    """
+    write_fragment(config_path, name, yaml_dict)
+
+    with locked(config_path):
+        if os.path.exists(config_path):
+            with open(config_path) as config_file:
+                index = yaml.load(config_file) or {}
+        else:
+            index = {'base': [], 'layers': []}
+            for initial_name, initial_yaml_dict in (initial_fragments() if initial_fragments else []):
+                if initial_name != name:
+                    write_fragment(config_path, initial_name, initial_yaml_dict)
+                    add_fragment_to_index(index, config_path, initial_name, initial_yaml_dict)
+
+        add_fragment_to_index(index, config_path, name, yaml_dict)
+        write_atomically(config_path, yaml.dump(index))
+
+    return index
+
+
+def remove_mapproxy_fragment(config_path, name):
+    """ Removes the fragment *name* and its layers from the MapProxy config at *config_path*.
+    """
+    fragment_path = get_fragment_path(config_path, name)
+
+    with locked(config_path):
+        if not os.path.exists(fragment_path):
+            return
+
+        with open(fragment_path) as fragment_file:
+            fragment = yaml.load(fragment_file) or {}
+
+        if os.path.exists(config_path):
+            with open(config_path) as config_file:
+                index = yaml.load(config_file) or {}
+            base = os.path.relpath(fragment_path, os.path.dirname(os.path.abspath(config_path)))
+            index['base'] = [b for b in index.get('base', []) if b != base]
+            layer_names = set(layer.get('name') for layer in fragment.get('layers', []))
+            index['layers'] = [layer for layer in index.get('layers', []) if layer.get('name') not in layer_names]
+            # Configs written before fragments were used hold grids and caches too.
+            for key in ['grids', 'caches']:
+                for fragment_key in fragment.get(key, {}):
+                    index.get(key, {}).pop(fragment_key, None)
+            write_atomically(config_path, yaml.dump(index))
+
+        os.remove(fragment_path)
 
 
 def conf_from_geopackage(geopackage_path, output_filepath=None):
@@ -109,6 +242,37 @@ def get_table_tile_matrix(geopackage_file, table_name):
         return cur.fetchall()
 
 
+def get_gpkg_tile_tables(geopackage_file, data_type='tiles'):
+    """
+    Reads the contents, organization_coordsys_id and tile matrix of every table in the geopackage with one connection.
+    :param geopackage_file: Path to the geopackage file.
+    :param data_type: The type of layer to return.
+    :return: A list of (gpkg_contents row as returned by get_gpkg_contents, organization_coordsys_id, tile matrix as
+        returned by get_table_tile_matrix) tuples.
+    """
+    db = sqlite3.connect(geopackage_file)
+    try:
+        contents = db.execute(
+            "SELECT c.table_name, c.data_type, c.identifier, c.description, c.last_change, c.min_x, c.min_y, c.max_x, "
+            "c.max_y, c.srs_id, s.organization_coordsys_id "
+            "FROM gpkg_contents c LEFT JOIN gpkg_spatial_ref_sys s ON s.srs_id = c.srs_id "
+            "WHERE c.data_type = ?", (data_type,)
+        ).fetchall()
+
+        tile_matrices = {}
+        for row in db.execute(
+                "SELECT m.table_name, m.zoom_level, m.matrix_width, m.matrix_height, m.tile_width, m.tile_height, "
+                "m.pixel_x_size, m.pixel_y_size "
+                "FROM gpkg_tile_matrix m JOIN gpkg_contents c ON c.table_name = m.table_name "
+                "WHERE c.data_type = ? "
+                "ORDER BY m.table_name, m.zoom_level", (data_type,)):
+            tile_matrices.setdefault(row[0], []).append(row[1:])
+    finally:
+        db.close()
+
+    return [(content[:10], content[10], tile_matrices.get(content[0], [])) for content in contents]
+
+
 def get_estimated_tile_res_ratio(tile_matrix):
     """
 
@@ -147,7 +311,7 @@ def get_res_table(tile_matrix):
 
 
 def get_geopackage_configuration_dict(geopackage_file):
-    gpkg_contents = get_gpkg_contents(geopackage_file, data_type='tiles')
+    gpkg_tile_tables = get_gpkg_tile_tables(geopackage_file, data_type='tiles')
     conf = {'grids': {},
             'caches': {},
             'layers': [],
@@ -157,10 +321,8 @@ def get_geopackage_configuration_dict(geopackage_file):
                          'wmts': None,
                          'wms': None}}
 
-    for gpkg_content in gpkg_contents:
+    for gpkg_content, srs, tile_matrix in gpkg_tile_tables:
         table_name = str(gpkg_content[0])
-        tile_matrix = get_table_tile_matrix(geopackage_file, table_name)
-        srs = get_table_organization_coordsys_id(geopackage_file, gpkg_content[9])
         if not tile_matrix or not srs:
             continue
         conf['grids']['{0}_{1}'.format(table_name, srs)] = {
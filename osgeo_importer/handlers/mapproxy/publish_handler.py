@@ -8,7 +8,7 @@ import yaml
 
 from conf_geopackage import conf_from_geopackage
 from osgeo_importer.handlers import ImportHandlerMixin
-from osgeo_importer.handlers.mapproxy.conf_geopackage import combine_mapproxy_yaml
+from osgeo_importer.handlers.mapproxy.conf_geopackage import add_mapproxy_fragment
 from osgeo_importer.models import MapProxyCacheConfig
 
 
@@ -57,15 +57,17 @@ class MapProxyGPKGTilePublishHandler(ImportHandlerMixin):
                 config_dict['layers'][0]['sources'] = [layer_name]
                 config_dict['layers'][0]['title'] = layer_name
                 config_yaml = yaml.safe_dump(config_dict)
-                MapProxyCacheConfig.objects.create(gpkg_filepath=uploaded_path, config=config_yaml)
-
-                # --- Update the config file on disk.
                 config_path = os.path.join(settings.MAPPROXY_CONFIG_DIR, settings.MAPPROXY_CONFIG_FILENAME)
-                individual_yaml_configs = [yaml.load(mpcc.config) for mpcc in MapProxyCacheConfig.objects.all()]
-                combined_yaml = combine_mapproxy_yaml(individual_yaml_configs)
-                combined_config = yaml.dump(combined_yaml)
-                with open(config_path, 'w') as config_file:
-                    config_file.write(combined_config)
+                cache_config = MapProxyCacheConfig.objects.create(gpkg_filepath=uploaded_path, config=config_yaml,
+                                                                  config_path=config_path)
+
+                # --- Write this layer's config fragment and reference it from the config file on disk, fragments
+                #    are written for every config if the file is missing.
+                add_mapproxy_fragment(
+                    cache_config.config_path, cache_config.fragment_name, config_dict,
+                    lambda: [(mpcc.fragment_name, yaml.load(mpcc.config))
+                             for mpcc in MapProxyCacheConfig.objects.filter(config_path=config_path)]
+                )
 
                 # --- Configure a tms link for this layer
                 if 'geonode_layer_id' in layer_config:
@@ -1,7 +1,15 @@
 import codecs
+from contextlib import contextmanager
+import fcntl
+import itertools
 import logging
+import math
+import multiprocessing
 import os
+import struct
+import tempfile
 
+import billiard
 from django import db
 from django.conf import settings
 from django.core.files.storage import FileSystemStorage
@@ -13,6 +21,7 @@ from osgeo_importer.models import UploadLayer
 
 from .handlers import IMPORT_HANDLERS
 from .inspectors import GDALInspector, OGRInspector
+from .writers import IMPORT_BATCH_SIZE, OSGEO_WRITER
 from .utils import (
     FileTypeNotAllowed,
     GdalErrorHandler,
@@ -21,8 +30,9 @@ from .utils import (
     raster_import,
     decode,
     convert_wkt_to_epsg,
-    reproject_coordinate_system,
-    database_schema_name
+    database_schema_name,
+    get_shapefile_encoding,
+    quote_ident
 )  # noqa: F401
 
 
@@ -38,6 +48,20 @@ VALID_EXTENSIONS = getattr(settings, 'OSGEO_IMPORTER_VALID_EXTENSIONS', DEFAULT_
 
 RASTER_FILES = getattr(settings, 'OSGEO_IMPORTER_RASTER_FILES', os.path.join(MEDIA_ROOT, 'osgeo_importer_raster'))
 UPLOAD_DIR = getattr(settings, 'OSGEO_IMPORTER_UPLOAD_DIR', os.path.join(MEDIA_ROOT, 'osgeo_importer_uploads'))
+# Number of processes used to copy a single large vector layer, 1 disables partitioned copies.
+IMPORT_PARTITION_WORKERS = getattr(settings, 'OSGEO_IMPORTER_PARTITION_WORKERS', 1)
+IMPORT_PARTITION_MIN_FEATURES = getattr(settings, 'OSGEO_IMPORTER_PARTITION_MIN_FEATURES', 1000000)
+# Partition worker processes running at once across every import on this host, and where their slots are locked.
+IMPORT_PARTITION_MAX_WORKERS = getattr(settings, 'OSGEO_IMPORTER_PARTITION_MAX_WORKERS', multiprocessing.cpu_count())
+IMPORT_PARTITION_LOCK_DIR = getattr(settings, 'OSGEO_IMPORTER_PARTITION_LOCK_DIR', tempfile.gettempdir())
+# Features written between the checkpoints of imports that don't batch their writes.
+IMPORT_CHECKPOINT_INTERVAL = getattr(settings, 'OSGEO_IMPORTER_CHECKPOINT_INTERVAL', 1000)
+# Number of features read to find the geometry types of a layer, None reads them all.
+GEOMETRY_TYPE_SAMPLE_SIZE = getattr(settings, 'OSGEO_IMPORTER_GEOMETRY_TYPE_SAMPLE_SIZE', None)
+
+# Shapefile shape types (2D only) mapped to OGR geometry types.
+SHAPEFILE_GEOMETRY_TYPES = {1: ogr.wkbPoint, 8: ogr.wkbMultiPoint}
+SHAPEFILE_MULTIPART_TYPES = {3: (ogr.wkbLineString, ogr.wkbMultiLineString), 5: (ogr.wkbPolygon, ogr.wkbMultiPolygon)}
 
 if not os.path.exists(RASTER_FILES):
     os.makedirs(RASTER_FILES)
@@ -159,6 +183,7 @@ class OGRImport(Import):
 
     source_inspectors = [GDALInspector]
     target_inspectors = [OGRInspector]
+    target_writer = OSGEO_WRITER
 
     def __init__(self, filename, target_store=None, upload_file=None):
         self.file = filename
@@ -173,6 +198,8 @@ class OGRImport(Import):
                                                                                                 d['HOST'], d['PORT'],
                                                                                                 database_schema_name())
             self.target_store = connection_string
+        else:
+            self.target_store = target_store
 
     def open_target_datastore(self, connection_string, *args, **kwargs):
         """
@@ -201,20 +228,87 @@ class OGRImport(Import):
 
         return datastore, created
 
-    def get_features_geometry_types(self, layer, type='id'):
+    def get_features_geometry_types(self, layer, type='id', sample_size=GEOMETRY_TYPE_SAMPLE_SIZE):
         """
-        Returns a list of distinct geometry types in a layer.
+        Returns a list of distinct geometry types in a layer, reading at most sample_size features (all if None).
         """
-        geom_types = []
-        if type == 'name':
-            [geom_types.append(f.geometry().GetGeometryName()) for f in layer if f.geometry()]
-        else:
-            [geom_types.append(f.geometry().GetGeometryType()) for f in layer if f.geometry()]
+        geom_types = set([layer.GetGeomType()])
+        # Only the geometries are needed, skip decoding the attributes.
+        layer_definition = layer.GetLayerDefn()
+        layer.SetIgnoredFields([layer_definition.GetFieldDefn(i).GetName()
+                                for i in range(layer_definition.GetFieldCount())])
 
-        geom_types.append(layer.GetGeomType())
-        geom_types = list(set(geom_types))
-        layer.ResetReading()
-        return geom_types
+        try:
+            for n, f in enumerate(layer):
+                if sample_size is not None and n >= sample_size:
+                    break
+
+                geometry = f.geometry()
+                if geometry:
+                    geom_types.add(geometry.GetGeometryName() if type == 'name' else geometry.GetGeometryType())
+        finally:
+            layer.SetIgnoredFields([])
+            layer.ResetReading()
+
+        return list(geom_types)
+
+    def get_shapefile_geometry_types(self, layer, source):
+        """
+        Returns a list of distinct geometry types in a 2D Shapefile layer using the record headers in the .shp/.shx
+        files rather than reading every geometry, or None if the files can't be read directly.
+        Only polygons made of several rings need their geometry read, as rings may be holes or separate parts.
+        """
+        path = source.GetDescription()
+        if os.path.isdir(path):
+            path = os.path.join(path, layer.GetName())
+        shp_file = '{}.shp'.format(os.path.splitext(path)[0])
+        shx_file = '{}.shx'.format(os.path.splitext(path)[0])
+
+        if not (os.path.isfile(shp_file) and os.path.isfile(shx_file)):
+            return
+
+        with open(shp_file, 'rb') as shp, open(shx_file, 'rb') as shx:
+            shp.seek(32)
+            shape_type, = struct.unpack('<i', shp.read(4))
+
+            if shape_type in SHAPEFILE_GEOMETRY_TYPES:
+                # Points and multipoints can't be mixed with the other member of their pair.
+                return [SHAPEFILE_GEOMETRY_TYPES[shape_type]]
+
+            if shape_type not in SHAPEFILE_MULTIPART_TYPES:
+                return
+
+            single, multi = SHAPEFILE_MULTIPART_TYPES[shape_type]
+            geom_types = set([layer.GetGeomType()])
+            shx.seek(100)
+
+            for index in itertools.count():
+                record = shx.read(8)
+                if len(record) < 8:
+                    break
+
+                # Offsets are in 16-bit words and point at the 8 byte record header.
+                offset, _ = struct.unpack('>ii', record)
+                shp.seek(offset * 2 + 8)
+                content = shp.read(40)
+                if len(content) < 40 or struct.unpack('<i', content[:4])[0] == 0:
+                    # Null shape
+                    continue
+
+                num_parts, = struct.unpack('<i', content[36:40])
+                if num_parts == 1:
+                    geom_types.add(single)
+                elif shape_type == 3:
+                    geom_types.add(multi)
+                else:
+                    feature = layer.GetFeature(index)
+                    geom_types.add(feature.geometry().GetGeometryType())
+
+                # Finding a multi-part geometry settles the layer's type.
+                if multi in geom_types:
+                    break
+
+        return list(geom_types)
 
     def get_layer_type(self, layer, source):
         """
@@ -239,7 +333,11 @@ class OGRImport(Import):
         layer_geom_type = layer.GetGeomType()
 
         if driver in formats_to_inspect:
-            features_geom_types = self.get_features_geometry_types(layer)
+            features_geom_types = None
+            if driver == 'esri shapefile':
+                features_geom_types = self.get_shapefile_geometry_types(layer, source)
+            if features_geom_types is None:
+                features_geom_types = self.get_features_geometry_types(layer)
 
             types_dict = {
                 'MultiPoint_Point': [1, 4],
@@ -261,6 +359,352 @@ class OGRImport(Import):
 
         return layer_geom_type
 
+    def get_coordinate_transformation(self, layer):
+        """
+        Returns the transformation of a layer's geometries into EPSG:4326 if its spatial reference can't be
+        identified as an EPSG code, otherwise None.
+        """
+        srs = layer.GetSpatialRef()
+        if not srs or srs.Clone().AutoIdentifyEPSG() == 0:
+            return
+
+        target_srs = osr.SpatialReference()
+        target_srs.ImportFromEPSG(4326)
+        # GDAL 3 would otherwise swap the axes to the authority's latitude, longitude order.
+        if hasattr(osr, 'OAMS_TRADITIONAL_GIS_ORDER'):
+            target_srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+
+        return osr.CoordinateTransformation(srs, target_srs)
+
+    def prepare_feature(self, feature, layer, target_layer, layer_options, source_fid, transformation=None,
+                        keep_fid=False):
+        """
+        Prepares a source feature to be written to the target layer: resets or copies its FID, reprojects
+        its geometry with *transformation* and promotes it to the target's Multi* type.
+        :param keep_fid: Keep the FID the source driver gives the feature even if the layer has no FID column.
+        """
+        if not (layer.GetFIDColumn() or keep_fid):
+            feature.SetFID(-1)
+
+        if transformation:
+            feature.geometry().Transform(transformation)
+
+        geom_type = feature.geometry().GetGeometryType()
+        target_geom_type = target_layer.GetGeomType()
+
+        if geom_type != target_geom_type and target_geom_type in range(4, 7):
+            if geom_type == target_geom_type - 3:
+                # Wrap a single geometry in its Multi* container, copying it once instead of going through WKB.
+                multi = ogr.Geometry(target_geom_type)
+                multi.AddGeometry(feature.geometry())
+            else:
+                if target_geom_type == 5:
+                    conversion_function = ogr.ForceToMultiLineString
+                elif target_geom_type == 4:
+                    conversion_function = ogr.ForceToMultiPoint
+                else:
+                    conversion_function = ogr.ForceToMultiPolygon
+
+                # The python bindings convert a clone, leaving the feature's geometry untouched.
+                multi = conversion_function(feature.geometry())
+
+            feature.SetGeometryDirectly(multi)
+
+        if source_fid is not None:
+            feature.SetFID(feature.GetField(source_fid))
+
+        return feature
+
+    def decode_fields(self, feature, string_fields, encoding):
+        """
+        Makes sure the text fields of a feature hold UTF-8, decoding them from *encoding*.  Fields already holding
+        valid UTF-8 are left alone when *encoding* is UTF-8.
+        """
+        utf8 = codecs.lookup(encoding).name == 'utf-8'
+
+        for field in string_fields:
+            fieldstr = feature.GetField(field)
+            if fieldstr is None:
+                continue
+
+            try:
+                decodedfield = fieldstr.decode(encoding, errors='strict')
+            except UnicodeDecodeError:
+                decodedfield = fieldstr.decode(errors='ignore')
+            except AttributeError:
+                continue
+            else:
+                if utf8:
+                    continue
+
+            feature.SetField(field, decodedfield)
+
+        return feature
+
+    def copy_features(self, layer, target_layer, target_datastore, layer_options, source_fid, start=0, count=None,
+                      on_commit=None, keep_fids=False):
+        """
+        Copies features with a geometry from the source layer to the target layer.
+        :param start: Index of the first feature to copy.
+        :param count: Number of features to read, or None to read the rest of the layer.
+        :param on_commit: Called after each batch is committed, self.features_read holds the index of the
+        next source feature.
+        :param keep_fids: Write every feature with its source FID, see prepare_feature.
+        :return: The number of features read.
+        """
+        writer = load_handler(self.target_writer, target_layer, target_datastore=target_datastore,
+                              batch_size=layer_options.get('batch_size', IMPORT_BATCH_SIZE), on_commit=on_commit)
+        layer_definition = layer.GetLayerDefn()
+        # When GDAL knows the source encoding (e.g. from the ENCODING open option) it already returns UTF-8.
+        string_fields = [] if layer.TestCapability(ogr.OLCStringsAsUTF8) else [
+            i for i in range(layer_definition.GetFieldCount())
+            if layer_definition.GetFieldDefn(i).GetType() == ogr.OFTString]
+        transformation = self.get_coordinate_transformation(layer)
+
+        layer.ResetReading()
+        if start:
+            layer.SetNextByIndex(start)
+
+        read = 0
+        self.features_read = start
+        while count is None or read < count:
+            feature = layer.GetNextFeature()
+            if feature is None:
+                break
+
+            read += 1
+            self.features_read += 1
+            if feature.geometry():
+                self.prepare_feature(feature, layer, target_layer, layer_options, source_fid, transformation,
+                                     keep_fids)
+                if string_fields:
+                    self.decode_fields(feature, string_fields, layer_options['encoding'])
+                writer.write(feature)
+
+        writer.close()
+        layer.ResetReading()
+        return read
+
+    def get_max_fid(self, target_layer):
+        """
+        Returns the largest FID in a PostGIS target layer.
+        """
+        with db.connections[settings.OSGEO_DATASTORE].cursor() as cursor:
+            cursor.execute('SELECT MAX({}) FROM {}.{}'.format(
+                quote_ident(target_layer.GetFIDColumn()), quote_ident(database_schema_name()),
+                quote_ident(target_layer.GetName())))
+            return cursor.fetchone()[0]
+
+    def save_checkpoint(self, upload_layer, target_layer=None, window=0):
+        """
+        Records how far the copy of a layer got on its UploadLayer, so a retried import can resume from there.
+        Up to *window* features past the checkpoint may be committed before the next one is recorded.
+        The target's largest FID identifies rows committed after the checkpoint when the target assigns FIDs.
+        """
+        max_fid = self.get_max_fid(target_layer) if target_layer else None
+        upload_layer.import_checkpoint = {'features_read': self.features_read, 'max_fid': max_fid, 'window': window}
+        upload_layer.save(update_fields=['import_checkpoint'])
+
+    def save_partition_checkpoint(self, upload_layer, partition):
+        """
+        Records how far the copy of one partition got in the checkpoint of its UploadLayer.  Partitions save
+        their checkpoints concurrently, so the row is locked while its checkpoint is updated.
+        """
+        with db.transaction.atomic():
+            upload_layer = UploadLayer.objects.select_for_update().get(id=upload_layer.id)
+            upload_layer.import_checkpoint['partitions'][partition]['features_read'] = self.features_read
+            upload_layer.save(update_fields=['import_checkpoint'])
+
+    @staticmethod
+    def get_checkpoint_window(batch_size):
+        """
+        Returns the number of features a copy committing *batch_size* features at a time writes between checkpoints.
+        """
+        return batch_size if batch_size > 1 else IMPORT_CHECKPOINT_INTERVAL
+
+    def get_checkpoint_callback(self, upload_layer, target_layer, batch_size, start=0, partition=None):
+        """
+        Returns the on_commit callback of a copy, checkpointing every batch, or every IMPORT_CHECKPOINT_INTERVAL
+        features when each feature is committed on its own.
+        :param partition: Index of the partition being copied, see copy_partitions.
+        """
+        batched = batch_size > 1
+        window = self.get_checkpoint_window(batch_size)
+        saved = [start]
+
+        def checkpoint():
+            if batched or self.features_read - saved[0] >= window:
+                saved[0] = self.features_read
+                if partition is None:
+                    self.save_checkpoint(upload_layer, target_layer, window)
+                else:
+                    self.save_partition_checkpoint(upload_layer, partition)
+        return checkpoint
+
+    def get_source_fids(self, layer, source_fid, start, count, end=None):
+        """
+        Returns the FIDs the next *count* features with a geometry from index *start* of the source layer are
+        written with, reading no further than index *end*.
+        """
+        fids = []
+        layer.ResetReading()
+        if start:
+            layer.SetNextByIndex(start)
+
+        index = start
+        while len(fids) < count and (end is None or index < end):
+            feature = layer.GetNextFeature()
+            if feature is None:
+                break
+            index += 1
+            if feature.geometry():
+                fids.append(feature.GetField(source_fid) if source_fid is not None else feature.GetFID())
+
+        layer.ResetReading()
+        return fids
+
+    def rollback_to_checkpoint(self, target_layer, checkpoint, layer=None, source_fid=None):
+        """
+        Removes rows committed to the target layer after the checkpoint and returns the index of the source feature
+        to resume from.  Rows written with the FIDs of the source layer are found from the features following the
+        checkpoint, other rows have FIDs larger than any committed before it.
+        """
+        table = '{}.{}'.format(quote_ident(database_schema_name()), quote_ident(target_layer.GetName()))
+        fid_column = quote_ident(target_layer.GetFIDColumn())
+
+        with db.connections[settings.OSGEO_DATASTORE].cursor() as cursor:
+            if checkpoint['max_fid'] is None:
+                cursor.execute('DELETE FROM {}'.format(table))
+            elif layer is not None and (layer.GetFIDColumn() or source_fid is not None):
+                fids = self.get_source_fids(layer, source_fid, checkpoint['features_read'],
+                                            checkpoint.get('window', IMPORT_BATCH_SIZE))
+                cursor.execute('DELETE FROM {} WHERE {} = ANY(%s::bigint[])'.format(table, fid_column), (fids,))
+            else:
+                cursor.execute('DELETE FROM {} WHERE {} > %s'.format(table, fid_column), (checkpoint['max_fid'],))
+            if cursor.rowcount:
+                logger.info('Removed {} rows of "{}" written after the last checkpoint.'.format(
+                    cursor.rowcount, target_layer.GetName()))
+
+        logger.info('Resuming import of "{}" from feature {}.'.format(target_layer.GetName(),
+                                                                    checkpoint['features_read']))
+        return checkpoint['features_read'] if checkpoint['max_fid'] is not None else 0
+
+    def rollback_partitions(self, target_layer, checkpoint, layer, source_fid=None):
+        """
+        Removes the rows each partition committed to the target layer after its checkpoint.  Partitions write
+        the FIDs of the source layer, so those rows are found from the features following each checkpoint.
+        :return: The partitions of the checkpoint.
+        """
+        table = '{}.{}'.format(quote_ident(database_schema_name()), quote_ident(target_layer.GetName()))
+        fid_column = quote_ident(target_layer.GetFIDColumn())
+        partitions = checkpoint['partitions']
+
+        with db.connections[settings.OSGEO_DATASTORE].cursor() as cursor:
+            for partition in partitions:
+                end = get_partition_end(partition)
+                if end is not None and partition['features_read'] >= end:
+                    continue
+
+                fids = self.get_source_fids(layer, source_fid, partition['features_read'], checkpoint['window'], end)
+                cursor.execute('DELETE FROM {} WHERE {} = ANY(%s::bigint[])'.format(table, fid_column), (fids,))
+                if cursor.rowcount:
+                    logger.info('Removed {} rows of "{}" written after the checkpoint of partition {}.'.format(
+                        cursor.rowcount, target_layer.GetName(), partition['start']))
+
+        return partitions
+
+    @staticmethod
+    def get_source_layer(data, layer_options):
+        """
+        Returns the source layer by the table name the GeoPackage inspector describes, or by index.
+        """
+        if layer_options.get('table_name'):
+            return data.GetLayerByName(str(layer_options['table_name']))
+        return data.GetLayer(layer_options.get('index'))
+
+    def get_progress_callback(self, upload_layer):
+        """
+        Returns a progress(fraction) function recording the progress of an import on its UploadLayer,
+        saving it when it reaches a new whole percentage.
+        """
+        last = [None]
+
+        def progress(fraction):
+            percent = int(fraction * 100)
+            if percent != last[0]:
+                last[0] = percent
+                UploadLayer.objects.filter(id=upload_layer.id).update(import_progress=percent)
+        return progress
+
+    def get_partitions(self, layer):
+        """
+        Returns a list of the ranges of the source layer to copy concurrently, or None if the layer should be
+        copied in a single pass.  Each range is a dict of the index of its first feature ('start'), its number
+        of features ('count', None for the last one, picking up anything the feature count missed) and the index
+        of the next feature to copy ('features_read').
+        """
+        if IMPORT_PARTITION_WORKERS < 2:
+            return
+
+        # Each worker seeks to the start of its partition.
+        if not (layer.TestCapability(ogr.OLCFastSetNextByIndex) and layer.TestCapability(ogr.OLCFastFeatureCount)):
+            return
+
+        feature_count = layer.GetFeatureCount()
+        if not feature_count or feature_count < IMPORT_PARTITION_MIN_FEATURES:
+            return
+
+        size = int(math.ceil(float(feature_count) / IMPORT_PARTITION_WORKERS))
+        partitions = [{'start': start, 'count': size, 'features_read': start}
+                      for start in range(0, feature_count, size)]
+        partitions[-1]['count'] = None
+        return partitions
+
+    def copy_partitions(self, partitions, layer, target_layer, target_datastore, layer_options, source_fid,
+                        ignored_fields=None, upload_layer=None):
+        """
+        Copies the rest of each partition of the source layer into the target layer, keeping the FIDs of the
+        source.  Partitions are copied by a pool of worker processes, each with its own source and target
+        connections, holding as many of the host's IMPORT_PARTITION_MAX_WORKERS slots as are free, or one after
+        the other in this process if fewer than two are.
+        :param upload_layer: The UploadLayer checkpointing the partitions, see save_partition_checkpoint.
+        """
+        jobs = []
+        for index, partition in enumerate(partitions):
+            end = get_partition_end(partition)
+            if end is None or partition['features_read'] < end:
+                count = end - partition['features_read'] if end is not None else None
+                jobs.append((self.__class__, self.file, self.target_store, layer_options, target_layer.GetName(),
+                             source_fid, ignored_fields, upload_layer.id if upload_layer else None, index,
+                             partition['features_read'], count))
+
+        logger.info('Copying "{}" in {} partitions.'.format(target_layer.GetName(), len(jobs)))
+        # Workers need the table, which OGR may not have created yet.
+        target_layer.SyncToDisk()
+
+        with partition_slots(min(len(jobs), IMPORT_PARTITION_WORKERS)) as workers:
+            if workers < 2:
+                read = [copy_partition(job) for job in jobs]
+            else:
+                # Forked workers must not share the database connections of this process.
+                for connection in db.connections.all():
+                    connection.close()
+
+                # Unlike multiprocessing, billiard can start a pool from the daemonic worker processes of Celery.
+                pool = billiard.Pool(workers)
+                try:
+                    read = pool.map(copy_partition, jobs)
+                    pool.close()
+                except BaseException:
+                    pool.terminate()
+                    raise
+                finally:
+                    pool.join()
+
+        writer = load_handler(self.target_writer, target_layer, target_datastore=target_datastore)
+        writer.finalize()
+        return sum(read)
+
     def import_file(self, *args, **kwargs):
         """
         Loads data that has been uploaded into whatever format we need for serving.
@@ -377,7 +821,9 @@ class OGRImport(Import):
                 filedir, filebase = os.path.split(filename)
                 outfile = "{}/{}.tif".format(filedir, layer_options['layer_name'].lower())
                 fileout = increment_filename(os.path.join(RASTER_FILES, outfile))
-                raster_import(layer_options['path'], fileout)
+                upload_layer = upload_layers_by_id[layer_options['upload_layer_id']]
+                raster_import(layer_options['path'], fileout, layer_options=layer_options,
+                              progress=self.get_progress_callback(upload_layer))
                 self.completed_layers.append([fileout, layer_options])
             elif layer_options['layer_type'] == 'vector':
                 target_file, _ = self.open_target_datastore(self.target_store)
@@ -388,35 +834,18 @@ class OGRImport(Import):
                     target_create_options.append('PRECISION=NO')
                     os.environ["PGCLIENTENCODING"] = "UTF8"
                     # Hack for CSV ingest into postgres. When using COPY, OGR prepends a bad newline to each feature
+                    # (only affects features written through OGR, PostGISCopyWriter encodes its own COPY rows)
                     if data.GetDriver().ShortName.lower() == 'csv':
                         os.environ["PG_USE_COPY"] = "false"
                     else:
                         os.environ["PG_USE_COPY"] = "true"
 
-                layer_options['encoding'] = 'utf-8'
                 # Read encoding from cpg file if exist
-                cpg_file = "{}.cpg".format(os.path.splitext(filename)[0])
-
-                if os.path.isfile(cpg_file):
-                    _encoding = open(cpg_file).read()
-                    _parts = _encoding.split()
-                    if len(_parts) > 1:
-                        # attempt to cover a case where encoding
-                        # is similar to ANSI 1252 (cp1252)
-                        _encoding = "cp{}".format(_parts[-1])
-
-                    try:
-                        codecs.lookup(_encoding)
-                        layer_options['encoding'] = _encoding
-                    except LookupError:
-                        pass
-
+                layer_options['encoding'] = get_shapefile_encoding(filename) or 'utf-8'
                 logger.debug('attribute encoding: {}'.format(layer_options['encoding']))
-                if data.GetDriver().ShortName.lower() == 'esri shapefile':
-                    os.environ['SHAPE_ENCODING'] = layer_options['encoding']
 
                 layer_options['modified_fields'] = {}
-                layer = data.GetLayer(layer_options.get('index'))
+                layer = self.get_source_layer(data, layer_options)
                 layer_name = layer_options['layer_name']
                 layer_geom_type = self.get_layer_type(layer, data)
                 srs = layer.GetSpatialRef()
@@ -431,23 +860,24 @@ class OGRImport(Import):
                     layer_options['srs'] = '{0}:{1}'.format(srs.GetAuthorityName(None), srs.GetAuthorityCode(None))
                 else:
                     # layer_options['srs'] = convert_wkt_to_epsg(srs.ExportToWkt())
-                    layer_ids = []
-                    for configuration_option in configuration_options:
-                        layer_ids = [configuration_option['upload_layer_id']]
-                    layer_id = layer_ids[0]
-                    layer_path = os.path.dirname(filename)
-                    original_layer_name = layer.GetName()
-                    layer_options['srs'] = reproject_coordinate_system(original_layer_name, layer_name, layer, layer_path)
-                    data, inspector = self.open_source_datastore(filename, *args, **kwargs)
-                    target_file, _ = self.open_target_datastore(self.target_store)
-                    layer = data.GetLayer(layer_options.get('index'))
-                    srs = layer.GetSpatialRef()
+                    # The geometries are reprojected as they are copied, see get_coordinate_transformation.
+                    srs = osr.SpatialReference()
+                    srs.ImportFromEPSG(4326)
+                    layer_options['srs'] = 'EPSG:4326'
+
+                upload_layer = upload_layers_by_id[layer_options['upload_layer_id']]
+                checkpoints = target_file.GetDriver().GetName() == 'PostgreSQL'
+
+                # Start the checkpoint before the table exists, a table without one is a completed import.
+                if checkpoints and target_file.GetLayerByName(str(layer_name)) is None:
+                    self.features_read = 0
+                    self.save_checkpoint(upload_layer)
 
                 logger.info('Creating dataset "{}" from file "{}"'.format(layer_name, target_file))
                 target_layer, created = self.get_or_create_target_dataset(target_file, str(layer_name), srs, layer_geom_type,
                                                           options=target_create_options)
 
-                if not created:
+                if not created and (not checkpoints or upload_layer.import_checkpoint is None):
                     # if the layer wasn't created, threre's no need for
                     # further processing lets just return it. This could happen
                     # if the user is retrying a previously failed import
@@ -475,7 +905,9 @@ class OGRImport(Import):
                         field_def.SetType(0)
 
                     if field_def.GetName() != 'wkb_geometry':
-                        target_layer.CreateField(field_def)
+                        # A resumed import only needs the names the fields were given.
+                        if created:
+                            target_layer.CreateField(field_def)
                         new_name = target_layer.GetLayerDefn().GetFieldDefn(i - wkb_field).GetName()
                         old_name = field_def.GetName()
 
@@ -490,42 +922,38 @@ class OGRImport(Import):
                 if wkb_field is not 0:
                     layer.SetIgnoredFields(['wkb_geometry'])
 
-                for feature in layer:
-                    if feature and feature.geometry():
-
-                        if not layer.GetFIDColumn():
-                            feature.SetFID(-1)
-
-                        if feature.geometry().GetGeometryType() != target_layer.GetGeomType() and \
-                                target_layer.GetGeomType() in range(4, 7):
-
-                            if target_layer.GetGeomType() == 5:
-                                conversion_function = ogr.ForceToMultiLineString
-                            elif target_layer.GetGeomType() == 4:
-                                conversion_function = ogr.ForceToMultiPoint
-                            else:
-                                conversion_function = ogr.ForceToMultiPolygon
-
-                            geom = ogr.CreateGeometryFromWkb(feature.geometry().ExportToWkb())
-                            feature.SetGeometry(conversion_function(geom))
-
-                        if source_fid is not None:
-                            feature.SetFID(feature.GetField(source_fid))
-
-                        # Force encoding for all text fields
-                        for field in range(0, feature.GetFieldCount()):
-                            if feature.GetFieldType(field) == ogr.OFTString:
-                                fieldstr = feature.GetField(field)
-                                # First try to decode as latin1 (default encoding for shapefiles)
-                                try:
-                                    decodedfield = fieldstr.decode(layer_options['encoding'], errors='strict')
-                                except UnicodeDecodeError:
-                                    decodedfield = fieldstr.decode(errors='ignore')
-                                except AttributeError:
-                                    continue
-                                feature.SetField(field, decodedfield)
-                        target_layer.CreateFeature(feature)
-                layer.ResetReading()
+                ignored_fields = ['wkb_geometry'] if wkb_field else None
+                batch_size = layer_options.get('batch_size', IMPORT_BATCH_SIZE) or 0
+                checkpoint = upload_layer.import_checkpoint if checkpoints and not created else None
+                start = 0
+                partitions = None
+                on_commit = None
+
+                if checkpoint and 'partitions' in checkpoint:
+                    partitions = self.rollback_partitions(target_layer, checkpoint, layer, source_fid)
+                else:
+                    if checkpoint:
+                        start = self.rollback_to_checkpoint(target_layer, checkpoint, layer, source_fid)
+
+                    partitions = None if start else self.get_partitions(layer)
+                    if partitions and checkpoints:
+                        upload_layer.import_checkpoint = {'partitions': partitions,
+                                                          'window': self.get_checkpoint_window(batch_size)}
+                        upload_layer.save(update_fields=['import_checkpoint'])
+                    elif checkpoints:
+                        on_commit = self.get_checkpoint_callback(upload_layer, target_layer, batch_size, start)
+
+                if partitions:
+                    self.copy_partitions(partitions, layer, target_layer, target_file, layer_options, source_fid,
+                                         ignored_fields, upload_layer if checkpoints else None)
+                else:
+                    self.copy_features(layer, target_layer, target_file, layer_options, source_fid, start,
+                                       on_commit=on_commit)
+
+                if checkpoints:
+                    upload_layer.import_checkpoint = None
+                    upload_layer.save(update_fields=['import_checkpoint'])
+
                 self.completed_layers.append([target_layer.GetName(), layer_options])
             else:
                 msg = 'Unexpected layer type: "{}"'.format(layer_options['layer_type'])
@@ -533,3 +961,64 @@ class OGRImport(Import):
                 raise Exception(msg)
 
         return self.completed_layers
+
+
+def get_partition_end(partition):
+    """
+    Returns the index following the last feature of a partition, or None if it reads to the end of the layer.
+    """
+    return partition['start'] + partition['count'] if partition['count'] is not None else None
+
+
+@contextmanager
+def partition_slots(count):
+    """
+    Acquires up to *count* of the IMPORT_PARTITION_MAX_WORKERS slots shared by the partition workers of every
+    import on this host, yielding the number acquired.  Slots are locked files in IMPORT_PARTITION_LOCK_DIR, which
+    are released when the block exits, or when the process holding them dies.
+    """
+    slots = []
+    try:
+        for slot in range(IMPORT_PARTITION_MAX_WORKERS):
+            if len(slots) >= count:
+                break
+
+            slot_file = open(os.path.join(IMPORT_PARTITION_LOCK_DIR, 'osgeo_importer_partition_{}.lock'.format(slot)),
+                             'a')
+            try:
+                fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                slot_file.close()
+            else:
+                slots.append(slot_file)
+
+        yield len(slots)
+    finally:
+        for slot_file in slots:
+            fcntl.flock(slot_file, fcntl.LOCK_UN)
+            slot_file.close()
+
+
+def copy_partition(job):
+    """
+    Copies one partition of a source layer, called in a partition worker process by OGRImport.copy_partitions.
+    """
+    importer_class, filename, target_store, layer_options, target_layer_name, source_fid, ignored_fields, \
+        upload_layer_id, partition, start, count = job
+    importer = importer_class(filename, target_store=target_store)
+    data, _ = importer.open_source_datastore(filename)
+    target_file, _ = importer.open_target_datastore(target_store)
+    layer = importer.get_source_layer(data, layer_options)
+
+    if ignored_fields:
+        layer.SetIgnoredFields(ignored_fields)
+
+    target_layer = target_file.GetLayerByName(target_layer_name)
+    on_commit = None
+    if upload_layer_id is not None:
+        on_commit = importer.get_checkpoint_callback(
+            UploadLayer.objects.get(id=upload_layer_id), target_layer,
+            layer_options.get('batch_size', IMPORT_BATCH_SIZE) or 0, start, partition)
+
+    return importer.copy_features(layer, target_layer, target_file, layer_options, source_fid, start, count,
+                                  on_commit, keep_fids=True)
@@ -1,12 +1,21 @@
+import hashlib
 from logging import getLogger
 import os
+import re
 import sqlite3
+import time
+from zipfile import is_zipfile
 
 from django import db
 from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
 import gdal
 import ogr
-from osgeo_importer.utils import NoDataSourceFound, GDAL_GEOMETRY_TYPES, increment, timeparse, quote_ident, parse
+from osgeo_importer.utils import (
+    NoDataSourceFound, GDAL_GEOMETRY_TYPES, increment, timeparse_many, quote_ident, parse, get_gdal_encoding,
+    get_shapefile_encoding, database_schema_name
+)
 
 
 gdal.UseExceptions()
@@ -16,6 +25,124 @@ logger = getLogger(__name__)
 OSGEO_INSPECTOR = getattr(settings, 'OSGEO_INSPECTOR', 'osgeo_importer.inspectors.GDALInspector')
 # Default "1" argument makes the data writeable
 GDAL_ACCESS_MODE = getattr(settings, 'GDAL_ACCESS_MODE', 1)
+# Django cache shared by web and task processes holding GDALInspector descriptions, a timeout of 0 disables it.
+DESCRIBE_CACHE = getattr(settings, 'OSGEO_IMPORTER_DESCRIBE_CACHE', 'default')
+DESCRIBE_CACHE_TIMEOUT = getattr(settings, 'OSGEO_IMPORTER_DESCRIBE_CACHE_TIMEOUT', 60 * 60)
+# Features read to estimate the count of layers whose driver can't count them without a full scan.
+FEATURE_COUNT_SAMPLE_SIZE = getattr(settings, 'OSGEO_IMPORTER_FEATURE_COUNT_SAMPLE_SIZE', 1000)
+# Compressed files, whose size says little about the size of the features in them.
+ARCHIVE_EXTENSIONS = ['.zip', '.kmz', '.gz', '.tgz', '.tar', '.7z']
+SUBDATASET_DIMENSIONS = re.compile(r'\[(\d+(?:x\d+)*)\]')
+
+# OGR field types of GeoPackage column types, other types are read as strings.
+GPKG_FIELD_TYPES = {'BOOLEAN': 'Integer', 'TINYINT': 'Integer', 'SMALLINT': 'Integer', 'MEDIUMINT': 'Integer',
+                    'INT': 'Integer64', 'INTEGER': 'Integer64', 'FLOAT': 'Real', 'DOUBLE': 'Real', 'REAL': 'Real',
+                    'DATE': 'Date', 'DATETIME': 'DateTime', 'BLOB': 'Binary'}
+GPKG_GEOMETRY_TYPES = {'GEOMETRY': 'Unknown', 'POINT': 'Point', 'LINESTRING': 'LineString', 'POLYGON': 'Polygon',
+                       'MULTIPOINT': 'MultiPoint', 'MULTILINESTRING': 'MultiLineString',
+                       'MULTIPOLYGON': 'MultiPolygon', 'GEOMETRYCOLLECTION': 'GeometryCollection'}
+
+# Returns NULL for values PostgreSQL can't parse, and for words such as 'now' that dateutil wouldn't accept.
+# Created in the datastore schema by each conversion, holding a transaction level advisory lock so concurrent
+# conversions don't replace it at the same time.
+PARSE_TIMESTAMP_FUNCTION = """
+SELECT pg_advisory_xact_lock(hashtext('osgeo_importer_parse_timestamp'));
+CREATE OR REPLACE FUNCTION {schema}.osgeo_importer_parse_timestamp(value text) RETURNS timestamp AS $function$
+BEGIN
+    IF value !~ '[0-9]' THEN
+        RETURN NULL;
+    END IF;
+    RETURN value::timestamp;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$function$ LANGUAGE plpgsql STABLE;
+"""
+
+
+def get_describe_cache_key(inspector_class, filename):
+    """
+    Returns the describe cache key of a file opened by an inspector class.
+    """
+    path = '{}.{}:{}'.format(inspector_class.__module__, inspector_class.__name__, os.path.abspath(filename))
+    return 'osgeo_importer.describe.{}'.format(hashlib.md5(repr(path)).hexdigest())
+
+
+def get_file_signature(filename):
+    """
+    Returns the name, size and modification time of a file and the files sharing its name (e.g. a shapefile's .dbf
+    and .cpg), or None if it isn't a local file.
+    """
+    if not os.path.isfile(filename):
+        return
+
+    directory, name = os.path.split(os.path.abspath(filename))
+    base = os.path.splitext(name)[0]
+    signature = []
+
+    for sibling in sorted(os.listdir(directory)):
+        if os.path.splitext(sibling)[0] == base:
+            stat = os.stat(os.path.join(directory, sibling))
+            signature.append([sibling, stat.st_size, stat.st_mtime])
+
+    return signature
+
+
+def invalidate_describe_cache(filename, inspector_class=None):
+    """
+    Removes the cached description of a file.
+    """
+    caches[DESCRIBE_CACHE].delete(get_describe_cache_key(inspector_class or GDALInspector, filename))
+
+
+def estimate_feature_count(layer, filename, layer_count=1, sample_size=FEATURE_COUNT_SAMPLE_SIZE):
+    """
+    Returns a (feature count, estimated) pair for a layer.  Drivers without a fast count get an estimate from the
+    GeoJSON size of a sample of features and the size of the file, which is only a rough guide: formats that are
+    more or less verbose than GeoJSON (CSV, KML, ...) can be off by an order of magnitude.  The count is None if the
+    file size is unknown or says nothing about the layer: virtual (/vsi) paths, archives, and files holding other
+    layers too (*layer_count*), whose share of it isn't known.  The count_features task fills in exact counts.
+    """
+    if layer.TestCapability(ogr.OLCFastFeatureCount):
+        return layer.GetFeatureCount(), False
+
+    # Some drivers know the count of a layer they've already read without reporting a fast count.
+    feature_count = layer.GetFeatureCount(force=0)
+    if feature_count >= 0:
+        return feature_count, False
+
+    count = 0
+    sample_bytes = 0
+    layer.ResetReading()
+    feature = layer.GetNextFeature()
+    while feature is not None and count < sample_size:
+        count += 1
+        sample_bytes += len(feature.ExportToJson())
+        feature = layer.GetNextFeature()
+    more = feature is not None
+    layer.ResetReading()
+
+    if not more:
+        return count, False
+
+    if not os.path.isfile(filename) or not sample_bytes or layer_count > 1 or is_archive(filename):
+        return None, True
+
+    return max(count, int(os.path.getsize(filename) * count / sample_bytes)), True
+
+
+def is_archive(filename):
+    """
+    Returns True if *filename* is a compressed archive, such as a zipped shapefile or a KMZ.
+    """
+    return os.path.splitext(filename)[1].lower() in ARCHIVE_EXTENSIONS or is_zipfile(filename)
+
+
+def sqlite_ident(name):
+    """
+    Quotes a SQLite identifier.
+    """
+    return '"{}"'.format(name.replace('"', '""'))
 
 
 class InspectorMixin(object):
@@ -86,11 +213,24 @@ class GDALInspector(InspectorMixin):
 
     def __init__(self, connection_string, *args, **kwargs):
         self.file = connection_string
-        self.data = None
+        self._data = None
         super(GDALInspector, self).__init__(*args, **kwargs)
 
+    def __enter__(self):
+        # The file is opened when its data is first read, so cached descriptions don't open it with GDAL.
+        return self
+
+    @property
+    def data(self):
+        """
+        The dataset opened with GDAL, opening the file on first use.
+        """
+        if self._data is None:
+            self.open(*self.args, **self.kwargs)
+        return self._data
+
     def close(self, *args, **kwargs):
-        self.data = None
+        self._data = None
 
     @property
     def method_safe_filetype(self):
@@ -121,6 +261,19 @@ class GDALInspector(InspectorMixin):
 
         return filename, args, kwargs
 
+    def prepare_shp(self, filename, *args, **kwargs):
+        """
+        Adds the ENCODING opening option from the .cpg file so GDAL recodes attributes to UTF-8.
+        """
+        encoding = get_shapefile_encoding(filename)
+
+        if encoding:
+            oo = kwargs.get('open_options', [])
+            oo.append('ENCODING={0}'.format(get_gdal_encoding(encoding)))
+            kwargs['open_options'] = oo
+
+        return filename, args, kwargs
+
     def prepare_zip(self, filename, *args, **kwargs):
         """
         Appends '/vsizip/' to the filename path.
@@ -150,18 +303,18 @@ class GDALInspector(InspectorMixin):
         open_options = kwargs.get('open_options', [])
 
         try:
-            self.data = gdal.OpenEx(filename, GDAL_ACCESS_MODE, open_options=open_options)
+            self._data = gdal.OpenEx(filename, GDAL_ACCESS_MODE, open_options=open_options)
         except:
             msg = 'gdal.OpenEx({}, {}) failed.'.format(filename, open_options)
             logger.debug(msg)
             raise NoDataSourceFound(msg)
 
-        if self.data is None:
+        if self._data is None:
             msg = 'gdal.OpenEx({}, {}) returned None.'.format(filename, open_options)
             logger.debug(msg)
             raise NoDataSourceFound(msg)
 
-        return self.data
+        return self._data
 
     @staticmethod
     def geometry_type(layer):
@@ -177,15 +330,169 @@ class GDALInspector(InspectorMixin):
         except KeyError:
             return
 
+    def get_cached_description(self):
+        """
+        Returns the cached {'signature', 'driver', 'description'} of the file if it hasn't changed since.
+        """
+        if not DESCRIBE_CACHE_TIMEOUT:
+            return
+
+        signature = get_file_signature(self.file)
+        if signature is None:
+            return
+
+        cached = caches[DESCRIBE_CACHE].get(get_describe_cache_key(type(self), self.file))
+        if cached and cached['signature'] == signature:
+            return cached
+
     def describe_fields(self):
         """
-        Returns a dict of the layers with fields and field types.
+        Returns a dict of the layers with fields and field types, cached until the file changes.
+        """
+        cached = self.get_cached_description()
+        if cached:
+            return cached['description']
+
+        signature = get_file_signature(self.file) if DESCRIBE_CACHE_TIMEOUT else None
+        description = self._describe_fields()
+
+        if signature is not None:
+            caches[DESCRIBE_CACHE].set(get_describe_cache_key(type(self), self.file),
+                                       {'signature': signature,
+                                        'driver': description[0]['driver'] if description
+                                        else self.get_driver().ShortName,
+                                        'description': description}, DESCRIBE_CACHE_TIMEOUT)
+
+        return description
+
+    def describe_gpkg(self):
+        """
+        Describes a GeoPackage from its metadata tables through a single SQLite connection, sparing GDAL from opening
+        every layer.  Returns None for packages GDAL should describe (e.g. gridded coverages).
         """
+        if not os.path.isfile(self.file):
+            return
+
+        try:
+            conn = sqlite3.connect(self.file)
+        except sqlite3.Error:
+            return
+
+        try:
+            cur = conn.cursor()
+            # Python 2's sqlite3 can't open read-only (mode=ro) URIs, refuse writes through the connection instead.
+            cur.execute('PRAGMA query_only = ON;')
+            cur.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view');")
+            tables = set(row[0] for row in cur.fetchall())
+            if 'gpkg_contents' not in tables or 'gpkg_2d_gridded_coverage_ancillary' in tables:
+                return
+
+            description = []
+            if 'gpkg_geometry_columns' in tables:
+                has_ogr_contents = 'gpkg_ogr_contents' in tables
+                # Feature tables first then attribute tables.  GDAL doesn't list the layers in a defined order, so
+                # they are opened by 'table_name' rather than 'index' (see OGRImport.get_source_layer and
+                # tasks.count_features).
+                cur.execute("""
+                SELECT c.table_name, g.column_name, g.geometry_type_name, c.min_x, c.min_y, c.max_x, c.max_y,
+                       s.organization, s.organization_coordsys_id, {feature_count}
+                FROM gpkg_contents c
+                LEFT JOIN gpkg_geometry_columns g ON g.table_name = c.table_name
+                LEFT JOIN gpkg_spatial_ref_sys s ON s.srs_id = COALESCE(g.srs_id, c.srs_id)
+                {join}
+                WHERE c.data_type IN ('features', 'attributes')
+                ORDER BY c.data_type = 'attributes';
+                """.format(feature_count='o.feature_count' if has_ogr_contents else 'NULL',
+                           join='LEFT JOIN gpkg_ogr_contents o ON o.table_name = c.table_name'
+                           if has_ogr_contents else ''))
+
+                for n, row in enumerate(cur.fetchall()):
+                    table_name, column_name, geometry_type_name, min_x, min_y, max_x, max_y = row[:7]
+                    organization, coordsys_id, feature_count = row[7:]
+
+                    if feature_count is None:
+                        cur.execute('SELECT COUNT(*) FROM {};'.format(sqlite_ident(table_name)))
+                        feature_count = cur.fetchone()[0]
+
+                    rtree = 'rtree_{}_{}'.format(table_name, column_name)
+                    if None in (min_x, min_y, max_x, max_y) and column_name and rtree in tables:
+                        cur.execute('SELECT MIN(minx), MIN(miny), MAX(maxx), MAX(maxy) FROM {};'.format(
+                            sqlite_ident(rtree)))
+                        min_x, min_y, max_x, max_y = cur.fetchone()
+
+                    fields = []
+                    cur.execute('PRAGMA table_info({});'.format(sqlite_ident(table_name)))
+                    for _, name, column_type, _, _, primary_key in cur.fetchall():
+                        if primary_key or name == column_name:
+                            continue
+                        column_type = (column_type or '').split('(')[0].strip().upper()
+                        fields.append({'name': name, 'type': GPKG_FIELD_TYPES.get(column_type, 'String')})
+
+                    if column_name:
+                        geometry_type = GPKG_GEOMETRY_TYPES.get((geometry_type_name or '').upper())
+                    else:
+                        geometry_type = 'None'
+
+                    description.append({'layer_name': table_name,
+                                        'table_name': table_name,
+                                        'feature_count': feature_count,
+                                        'feature_count_estimated': False,
+                                        'fields': fields,
+                                        'index': n,
+                                        'geom_type': geometry_type,
+                                        'raster': False,
+                                        'layer_type': 'vector',
+                                        'driver': 'GPKG',
+                                        'layer_definition': None,
+                                        'bbox': None if None in (min_x, min_y, max_x, max_y)
+                                        else [min_x, min_y, max_x, max_y],
+                                        'srs': '{}:{}'.format(organization.upper(), coordsys_id)
+                                        if organization and coordsys_id is not None else None})
+
+            if 'gpkg_tile_matrix_set' in tables:
+                cur.execute("""
+                SELECT t.table_name FROM gpkg_tile_matrix_set t
+                JOIN gpkg_contents c ON c.table_name = t.table_name
+                WHERE c.data_type = 'tiles' ORDER BY t.table_name;
+                """)
+                tile_tables = [row[0] for row in cur.fetchall()]
+
+                # GDAL opens a package with a single tile table as an RGBA raster, imported as tiles, and lists
+                # packages with several as raster subdatasets.
+                if len(tile_tables) == 1:
+                    description.append({'index': 0,
+                                        'layer_name': tile_tables[0],
+                                        'path': self.file,
+                                        'raster': False,
+                                        'layer_type': 'tile',
+                                        'driver': 'GPKG', })
+                else:
+                    for m, table_name in enumerate(tile_tables):
+                        description.append({'index': len(description),
+                                            'subdataset_index': m,
+                                            'path': 'GPKG:{}:{}'.format(self.file, table_name),
+                                            'layer_name': table_name,
+                                            'layer_type': 'raster',
+                                            'raster': True, 'driver': 'GPKG',
+                                            'description': table_name})
+
+            return description or None
+        except sqlite3.Error as e:
+            logger.warn('Unable to read the GeoPackage tables of {}, describing it with GDAL: {}'.format(self.file, e))
+        finally:
+            conn.close()
+
+    def _describe_fields(self):
+        describe_method = 'describe_{0}'.format(self.method_safe_filetype)
+
+        if hasattr(self, describe_method):
+            # describe hooks read formats they understand without opening every layer through GDAL
+            description = getattr(self, describe_method)()
+            if description is not None:
+                return description
+
         opened_file = self.data
         description = []
-
-        if not opened_file:
-            opened_file = self.open()
         driver = opened_file.GetDriver().ShortName
 
         # Get Vector Layers: if dataset contains vector layers, GetLayerCount()
@@ -204,7 +511,8 @@ class GDALInspector(InspectorMixin):
                                  'driver': driver,
                                  'layer_definition': None}
             if driver != 'WFS':
-                layer_description['feature_count'] = layer.GetFeatureCount()
+                layer_description['feature_count'], layer_description['feature_count_estimated'] = \
+                    estimate_feature_count(layer, self.file, opened_file.GetLayerCount())
                 layer_definition = layer.GetLayerDefn()
 
                 for i in range(layer_definition.GetFieldCount()):
@@ -241,32 +549,36 @@ class GDALInspector(InspectorMixin):
                                  'driver': driver}
             description.append(layer_description)
 
-        # Get sub layers, if present
+        # Get sub layers, if present.  They are described from their metadata, the import opens them.
         raster_list = opened_file.GetSubDatasets()
         for m in range(0, raster_list.__len__()):
-            layer = gdal.OpenEx(raster_list[m][0])
+            path, subdataset_description = raster_list[m]
             layer_description = {'index': len(description),
                                  'subdataset_index': m,
-                                 'path': raster_list[m][0],
-                                 'layer_name': raster_list[m][0].split(':')[-1],
+                                 'path': path,
+                                 'layer_name': path.split(':')[-1],
                                  'layer_type': 'raster',
-                                 'raster': True, 'driver': driver}
+                                 'raster': True, 'driver': driver,
+                                 'description': subdataset_description}
+            # e.g. "[12x180x360] temperature (32-bit floating-point)"
+            dimensions = SUBDATASET_DIMENSIONS.match(subdataset_description)
+            if dimensions:
+                layer_description['dimensions'] = [int(size) for size in dimensions.group(1).split('x')]
             description.append(layer_description)
 
         return description
 
     def get_driver(self):
-        opened_file = self.data
-
-        if not opened_file:
-            opened_file = self.open()
-
-        return opened_file.GetDriver()
+        return self.data.GetDriver()
 
     def file_type(self):
         """
         Returns the data's file type (via the GDAL driver name)
         """
+        cached = self.get_cached_description()
+        if cached:
+            return cached['driver']
+
         return self.get_driver().ShortName
 
 
@@ -356,93 +668,182 @@ class OGRTruncatedConverter(OGRInspector):
         return field_schema
 
 
-class BigDateOGRFieldConverter(OGRInspector):
-
-    def convert_field(self, layer_name, field):
-        field_as_string = str(field)
-        xd_col = '{0}_xd'.format(field).lower()
-        parsed_col = '{0}_parsed'.format(field).lower()
-        target_layer = self.data.GetLayerByName(layer_name)
-
-        # target_layer.GetLayerDefn().GetFieldIndex(parsed_col) raises errors when the field does not
-        # exist with older versions of OGR
-        while target_layer.FindFieldIndex(xd_col, 1) >= 0:
-            xd_col = increment(xd_col)
-
-        while target_layer.FindFieldIndex(parsed_col, 1) >= 0:
-            parsed_col = increment(parsed_col)
-
-        target_layer.CreateField(ogr.FieldDefn(xd_col, ogr.OFTInteger64))
-        xd_col_index = target_layer.GetLayerDefn().GetFieldIndex(xd_col)
-        target_layer.CreateField(ogr.FieldDefn(parsed_col, ogr.OFTString))
-        parsed_col_index = target_layer.GetLayerDefn().GetFieldIndex(parsed_col)
+def get_distinct_values(cursor, table, columns):
+    """
+    Returns a {value: row count} dict of the non-empty text values of each (column, condition) pair, read in one
+    pass over the table.
+    """
+    rows = ', '.join('({}, {}::text, {})'.format(i, column, condition) for i, (column, condition) in enumerate(columns))
+    cursor.execute("SELECT x.i, x.value, count(*) FROM {0}, LATERAL (VALUES {1}) AS x(i, value, selected) "
+                   "WHERE x.selected AND x.value IS NOT NULL AND x.value <> '' GROUP BY 1, 2".format(table, rows))
 
-        for feat in target_layer:
+    values = [{} for column in columns]
+    for i, value, count in cursor.fetchall():
+        values[i][value] = count
+    return values
 
-            if not feat:
-                continue
 
-            string_field = feat[field_as_string]
+def update_from_lookups(cursor, table, columns, lookups, batch_size=1000):
+    """
+    Fills empty target columns from lookups of the source columns' text values, in one pass over the rows with
+    an empty target column.
+    :param columns: A list of (source column, [(target column, SQL type), ...]) pairs.
+    :param lookups: A {value: (target value, ...)} dict for each pair.
+    """
+    width = max(len(targets) for _, targets in columns)
+    cursor.execute('CREATE TEMPORARY TABLE osgeo_importer_lookup (i integer, value text, {}, PRIMARY KEY (i, value)) '
+                   'ON COMMIT DROP'.format(', '.join('v{} text'.format(j) for j in range(width))))
 
-            if string_field:
-                xd, parsed = timeparse(str(string_field))
+    rows = [[i, value] + list(targets) + [None] * (width - len(targets))
+            for i, lookup in enumerate(lookups) for value, targets in lookup.items()]
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        cursor.execute('INSERT INTO osgeo_importer_lookup VALUES {}'.format(
+            ', '.join(['({})'.format(', '.join(['%s'] * (width + 2)))] * len(batch))),
+            [param for row in batch for param in row])
 
-                feat.SetField(xd_col_index, xd)
-                feat.SetField(parsed_col_index, parsed)
+    assignments = []
+    for i, (source, targets) in enumerate(columns):
+        for j, (target, sql_type) in enumerate(targets):
+            assignments.append('{2} = COALESCE(t.{2}, (SELECT v{3} FROM osgeo_importer_lookup l WHERE l.i = {0} '
+                               'AND l.value = t.{1}::text)::{4})'.format(i, source, target, j, sql_type))
 
-                target_layer.SetFeature(feat)
+    cursor.execute('UPDATE {} AS t SET {} WHERE {}'.format(table, ', '.join(assignments), ' OR '.join(
+        '({} IS NOT NULL AND ({}))'.format(source, ' OR '.join('{} IS NULL'.format(target) for target, _ in targets))
+        for source, targets in columns)))
 
-            # prevent segfaults
-            feat = None
-        conn = db.connections[settings.OSGEO_DATASTORE]
-        cursor = conn.cursor()
-        query = """
-        DO $$
-        BEGIN
-        IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname='bigdate') THEN
-        CREATE DOMAIN bigdate bigint;
-        END IF;
-        END;
-        $$;
 
-        ALTER TABLE %s ALTER COLUMN %s TYPE bigdate;
-        """ % (quote_ident(layer_name), quote_ident(xd_col))
+class BigDateOGRFieldConverter(OGRInspector):
+    """
+    Converts fields to bigdates, parsing each distinct value once and writing them back in one pass.
+    """
 
-        cursor.execute(query)
+    def convert_field(self, layer_name, field):
+        return self.convert_fields(layer_name, [field])[field]
 
-        return xd_col
+    def convert_fields(self, layer_name, fields):
+        """
+        Adds the bigdate and parsed columns of each field and fills them in one pass over the table.
+        :return: A {field: bigdate column} dict.
+        """
+        start = time.time()
+        target_layer = self.data.GetLayerByName(layer_name)
+        new_cols = {}
+        taken = set()
+
+        for field in fields:
+            xd_col = '{0}_xd'.format(field).lower()
+            parsed_col = '{0}_parsed'.format(field).lower()
+
+            # target_layer.GetLayerDefn().GetFieldIndex(parsed_col) raises errors when the field does not
+            # exist with older versions of OGR
+            while target_layer.FindFieldIndex(xd_col, 1) >= 0 or xd_col in taken:
+                xd_col = increment(xd_col)
+
+            while target_layer.FindFieldIndex(parsed_col, 1) >= 0 or parsed_col in taken:
+                parsed_col = increment(parsed_col)
+
+            taken.update([xd_col, parsed_col])
+            new_cols[field] = (xd_col, parsed_col)
+
+        table = '{}.{}'.format(quote_ident(database_schema_name()), quote_ident(layer_name))
+        columns = [(quote_ident(field), [(quote_ident(new_cols[field][0]), 'bigint'),
+                                         (quote_ident(new_cols[field][1]), 'varchar')]) for field in fields]
+        self.conversion_stats = {}
+
+        with transaction.atomic(using=settings.OSGEO_DATASTORE):
+            with db.connections[settings.OSGEO_DATASTORE].cursor() as cursor:
+                cursor.execute("""
+                DO $$
+                BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname='bigdate') THEN
+                CREATE DOMAIN bigdate bigint;
+                END IF;
+                END;
+                $$;
+
+                ALTER TABLE {0} {1};
+                """.format(table, ', '.join('ADD COLUMN {} bigdate, ADD COLUMN {} varchar'.format(xd_col, parsed_col)
+                                             for _, ((xd_col, _), (parsed_col, _)) in columns)))
+
+                counts = get_distinct_values(cursor, table, [(source, 'true') for source, _ in columns])
+                lookups = []
+
+                for field, field_counts in zip(fields, counts):
+                    parse_start = time.time()
+                    parsed = timeparse_many(field_counts.keys())
+                    parse_time = time.time() - parse_start
+                    lookup = dict((value, (str(int(xd)), iso)) for value, (xd, iso) in parsed.items() if xd is not None)
+                    lookups.append(lookup)
+
+                    self.conversion_stats[field] = {
+                        'rows': sum(field_counts.values()),
+                        'distinct_values': len(field_counts),
+                        'parsed_values': len(lookup),
+                        'unparsed_values': len(field_counts) - len(lookup),
+                        'parse_seconds': round(parse_time, 3),
+                        'values_parsed_per_second': round(len(field_counts) / parse_time) if parse_time else None,
+                    }
+
+                update_from_lookups(cursor, table, columns, lookups)
+
+        logger.info('Converted {} fields of {} to bigdates in {:.2f}s: {}'.format(
+            len(fields), layer_name, time.time() - start, self.conversion_stats))
+
+        return dict((field, xd_col) for field, (xd_col, _) in new_cols.items())
 
 
 class OGRFieldConverter(OGRInspector):
     """
-    Uses dateutil.parse to parse date times.
+    Converts fields to dates with one UPDATE parsing the values in PostgreSQL, values it can't parse are parsed
+    with dateutil.parse.
     """
 
     def convert_field(self, layer_name, field):
-        fieldname = '{0}_as_date'.format(field)
-        target_layer = self.data.GetLayerByName(layer_name)
-
-        while target_layer.GetLayerDefn().GetFieldIndex(fieldname) >= 0:
-            fieldname = increment(fieldname)
-
-        target_layer.CreateField(ogr.FieldDefn(fieldname, ogr.OFTDateTime))
-        field_index = target_layer.GetLayerDefn().GetFieldIndex(fieldname)
-
-        for feat in target_layer:
-
-            if not feat:
-                continue
-
-            string_field = feat[str(field)]
-
-            if string_field:
-                pars = parse(str(string_field))
+        return self.convert_fields(layer_name, [field])[field]
 
-                feat.SetField(field_index, pars.year, pars.month, pars.day, pars.hour, pars.minute, pars.second,
-                              pars.microsecond)
-
-                target_layer.SetFeature(feat)
-
-            feat = None
-
-        return fieldname
+    def convert_fields(self, layer_name, fields):
+        """
+        Adds a date column for each field and fills them together.
+        :return: A {field: date column} dict.
+        """
+        target_layer = self.data.GetLayerByName(layer_name)
+        new_cols = {}
+
+        for field in fields:
+            fieldname = '{0}_as_date'.format(field)
+
+            while target_layer.GetLayerDefn().GetFieldIndex(fieldname) >= 0 or fieldname in new_cols.values():
+                fieldname = increment(fieldname)
+
+            new_cols[field] = fieldname
+
+        schema = quote_ident(database_schema_name())
+        table = '{}.{}'.format(schema, quote_ident(layer_name))
+        # Column names are laundered to lower case by OGR.
+        columns = [(quote_ident(field), [(quote_ident(new_cols[field].lower()), 'timestamp')]) for field in fields]
+
+        with transaction.atomic(using=settings.OSGEO_DATASTORE):
+            with db.connections[settings.OSGEO_DATASTORE].cursor() as cursor:
+                cursor.execute(PARSE_TIMESTAMP_FUNCTION.format(schema=schema))
+                cursor.execute('ALTER TABLE {0} {1}'.format(table, ', '.join(
+                    'ADD COLUMN {} timestamp with time zone'.format(date_col) for _, ((date_col, _),) in columns)))
+                # Month first, like dateutil.
+                cursor.execute("SET LOCAL DateStyle = 'ISO, MDY'")
+                cursor.execute('UPDATE {0} SET {1} WHERE {2}'.format(
+                    table,
+                    ', '.join('{} = {}.osgeo_importer_parse_timestamp({}::text)'.format(date_col, schema, source)
+                              for source, ((date_col, _),) in columns),
+                    ' OR '.join('{} IS NOT NULL'.format(source) for source, _ in columns)))
+
+                unparsed = get_distinct_values(cursor, table, [(source, '{} IS NULL'.format(date_col))
+                                                               for source, ((date_col, _),) in columns])
+                if any(unparsed):
+                    logger.info('Parsing {} distinct values of {} with dateutil.'.format(
+                        sum(len(values) for values in unparsed), layer_name))
+                    # Like PostgreSQL's timestamp parsing, keep the local time of values with a time zone.
+                    lookups = [dict((value, (parse(value).replace(tzinfo=None).isoformat(),)) for value in values)
+                               for values in unparsed]
+                    update_from_lookups(cursor, table, columns, lookups)
+
+        return new_cols
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import os
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def set_config_path(apps, schema_editor):
+    """ Configs published before their config path was stored were published to the configured MapProxy config.
+    """
+    if hasattr(settings, 'MAPPROXY_CONFIG_DIR'):
+        MapProxyCacheConfig = apps.get_model('osgeo_importer', 'MapProxyCacheConfig')
+        MapProxyCacheConfig.objects.update(
+            config_path=os.path.join(settings.MAPPROXY_CONFIG_DIR, settings.MAPPROXY_CONFIG_FILENAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osgeo_importer', '0015_uploadlayer_feature_count_estimated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mapproxycacheconfig',
+            name='config_path',
+            field=models.CharField(default='', max_length=1000, blank=True),
+        ),
+        migrations.RunPython(set_config_path, migrations.RunPython.noop),
+    ]
@@ -28,6 +28,8 @@ from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from jsonfield import JSONField
 
 try:
@@ -193,6 +195,8 @@ class UploadFile(models.Model):
         super(UploadFile, self).save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
+        from .inspectors import invalidate_describe_cache
+        invalidate_describe_cache(self.file.path)
         self.file.delete(False)
         super(UploadFile, self).delete(*args, **kwargs)
 
@@ -213,11 +217,17 @@ class UploadLayer(models.Model):
     import_status = models.CharField(max_length=15, blank=True, null=True)
     task_id = models.CharField(max_length=36, blank=True, null=True)
     feature_count = models.IntegerField(null=True, blank=True)
+    # The feature count is an estimate until count_features has counted the layer.
+    feature_count_estimated = models.BooleanField(default=False)
     # Name of the layer as known in the file/package/endpoint it came from.
     internal_layer_name = models.CharField(max_length=64, null=True)
     # Geonode-wide unique name for layer.
     layer_name = models.CharField(max_length=64, null=True)
     layer_type = models.CharField(max_length=10, null=True)
+    # Progress of an interrupted import, {'features_read': ..., 'max_fid': ...}; None once the layer is copied.
+    import_checkpoint = JSONField(null=True, blank=True)
+    # Percentage of the layer's data written so far, for imports that report it.
+    import_progress = models.FloatField(null=True, blank=True)
 
     @property
     def file_name(self):
@@ -338,3 +348,24 @@ class MapProxyCacheConfig(models.Model):
     # Location of the file this config is for
     gpkg_filepath = models.CharField(max_length=1000)
     config = models.TextField()
+    # The MapProxy config file referencing this config's fragment, when it was published.
+    config_path = models.CharField(max_length=1000, blank=True, default='')
+
+    @property
+    def fragment_name(self):
+        return str(self.id)
+
+    @property
+    def fragment_path(self):
+        from .handlers.mapproxy.conf_geopackage import get_fragment_path
+        return get_fragment_path(self.config_path, self.fragment_name) if self.config_path else None
+
+
+@receiver(post_delete, sender=MapProxyCacheConfig)
+def remove_mapproxy_cache_config_fragment(sender, instance, **kwargs):
+    """ Removes a deleted config's fragment from the MapProxy config it was published to, including configs deleted
+        by a QuerySet or a cascade.
+    """
+    from .handlers.mapproxy.conf_geopackage import remove_mapproxy_fragment
+    if instance.config_path:
+        remove_mapproxy_fragment(instance.config_path, instance.fragment_name)
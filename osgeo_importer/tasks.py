@@ -98,3 +98,23 @@ def remove_path(path):
     """
     if os.path.exists(path):
         shutil.rmtree(path)
+
+
+@app.task(base=ExceptionLoggingTask)
+def count_features(upload_layer_id):
+    """
+    Replaces the estimated feature count of an UploadLayer with an exact count.
+    """
+    from osgeo_importer.inspectors import GDALInspector
+    upload_layer = UploadLayer.objects.get(id=upload_layer_id)
+
+    with GDALInspector(upload_layer.upload_file.file.path) as inspector:
+        # The layer's index in the inspector's description may not be its index in GDAL, e.g. for GeoPackages.
+        layer = None
+        if upload_layer.internal_layer_name:
+            layer = inspector.data.GetLayerByName(str(upload_layer.internal_layer_name))
+        if layer is None:
+            layer = inspector.data.GetLayer(upload_layer.index)
+        feature_count = layer.GetFeatureCount()
+
+    UploadLayer.objects.filter(id=upload_layer_id).update(feature_count=feature_count, feature_count_estimated=False)
@@ -23,14 +23,17 @@ import shutil
 import tempfile
 
 from django.test import SimpleTestCase
+from mock import patch
 from nose.tools import eq_
 import yaml
 
 from mapproxy.script.conf.app import config_command
-from osgeo_importer.handlers.mapproxy.conf_geopackage import get_gpkg_contents, \
-    get_table_tile_matrix, get_estimated_tile_res_ratio, get_res_table, get_geopackage_configuration_dict
+from osgeo_importer.handlers.mapproxy.conf_geopackage import get_gpkg_contents, get_gpkg_tile_tables, \
+    get_table_organization_coordsys_id, get_table_tile_matrix, get_estimated_tile_res_ratio, get_res_table, \
+    get_geopackage_configuration_dict
 from mapproxy.test.helper import capture
-from osgeo_importer.handlers.mapproxy.conf_geopackage import combine_mapproxy_yaml
+from osgeo_importer.handlers.mapproxy.conf_geopackage import combine_mapproxy_yaml, add_mapproxy_fragment, \
+    remove_mapproxy_fragment, write_atomically
 from osgeo_importer.tests.test_settings import _TEST_FILES_DIR
 
 
@@ -267,6 +270,43 @@ class TestMapProxyConfCmd(SimpleTestCase):
             }])
             eq_(len(conf['layers'][0]['layers']), 2)
 
+    def test_mapproxy_fragments(self):
+        config_path = self.tmp_filename('geonode.yaml')
+        first = {'grids': {'a': {}}, 'caches': {'a': {}}, 'services': {'demo': None},
+                 'layers': [{'name': 'a', 'sources': ['a']}]}
+        second = {'grids': {'b': {}}, 'caches': {'b': {}}, 'services': {'demo': None},
+                  'layers': [{'name': 'b', 'sources': ['b']}]}
+
+        # A missing config file gets the fragments of the initial documents.
+        add_mapproxy_fragment(config_path, '2', second, lambda: [('1', first), ('2', second)])
+        with open(config_path) as config_file:
+            conf = yaml.load(config_file)
+        eq_(conf['base'], ['geonode.d/1.yaml', 'geonode.d/2.yaml'])
+        eq_(conf['layers'], first['layers'] + second['layers'])
+        with open(self.tmp_filename('geonode.d/2.yaml')) as fragment_file:
+            eq_(yaml.load(fragment_file), second)
+
+        remove_mapproxy_fragment(config_path, '1')
+        with open(config_path) as config_file:
+            conf = yaml.load(config_file)
+        eq_(conf['base'], ['geonode.d/2.yaml'])
+        eq_(conf['layers'], second['layers'])
+        eq_(os.listdir(self.tmp_filename('geonode.d')), ['2.yaml'])
+
+    def test_write_atomically(self):
+        config_path = self.tmp_filename('geonode.yaml')
+        write_atomically(config_path, 'first')
+
+        # An interrupted write leaves the file as it was and removes the temporary file.
+        with patch('os.rename', side_effect=KeyboardInterrupt):
+            self.assertRaises(KeyboardInterrupt, write_atomically, config_path, 'second')
+        with patch('os.fdopen', side_effect=OSError):
+            self.assertRaises(OSError, write_atomically, config_path, 'second')
+
+        with open(config_path) as config_file:
+            eq_(config_file.read(), 'first')
+        eq_(os.listdir(self.dir), ['geonode.yaml'])
+
     def test_get_gpkg_contents(self):
         returned_contents = get_gpkg_contents(self.get_test_gpkg())
         expected_results = [('cache', 'tiles', 'cache', 'Created with Mapproxy.', '2016-06-10T15:03:39.390Z',
@@ -299,6 +339,14 @@ class TestMapProxyConfCmd(SimpleTestCase):
                             (18, 262144, 262144, 256, 256, 0.5971642834779395, 0.5971642834779395)]
         eq_(expected_results, returned_contents)
 
+    def test_get_gpkg_tile_tables(self):
+        gpkg = self.get_test_gpkg()
+        returned_contents = get_gpkg_tile_tables(gpkg)
+        eq_([content for content, srs, tile_matrix in returned_contents], get_gpkg_contents(gpkg))
+        for content, srs, tile_matrix in returned_contents:
+            eq_(srs, get_table_organization_coordsys_id(gpkg, content[9]))
+            eq_(tile_matrix, get_table_tile_matrix(gpkg, content[0]))
+
     def test_get_estimated_tile_res_ratio(self):
         # Test one level
         returned_contents = get_estimated_tile_res_ratio(((0, 1, 1, 256, 256, 156543.03392804097, 156543.03392804097),))
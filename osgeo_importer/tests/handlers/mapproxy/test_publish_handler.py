@@ -1,4 +1,6 @@
 import os
+import shutil
+import tempfile
 from unittest.case import skipUnless
 
 from django.test import TestCase
@@ -41,7 +43,8 @@ class TestMapProxyGPKGTilePublishHandler(TestCase):
     @patch.object(osgeo_importer.handlers.mapproxy.publish_handler, 'Layer')
     def test_handle_gpkg(self, MockLayer, MockLink):
         filenames = ['sde-NE2_HR_LC_SR_W_DR.gpkg']
-        testing_config_dir = '/tmp'
+        testing_config_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, testing_config_dir)
         testing_config_filename = 'geonode.yaml'
 
         # Check that each of these files results in the two expected changes:
@@ -76,20 +79,27 @@ class TestMapProxyGPKGTilePublishHandler(TestCase):
                 'MAPPROXY_CONFIG_DIR': testing_config_dir,
                 'MAPPROXY_CONFIG_FILENAME': testing_config_filename,
             }
+            conf_path = os.path.join(testing_config_dir, testing_config_filename)
             with self.settings(**test_settings):
                 mpph.handle(layer_name, layer_config)
 
-            # --- An instance of MapProxyCacheConfig should have been created
-            self.assertEqual(MapProxyCacheConfig.objects.count(), 1)
-            mpcc = MapProxyCacheConfig.objects.first()
-            self.assertEqual(mpcc.gpkg_filepath, filepath)
-            mpcc.delete()
-
-            # --- A mapproxy yaml config with name matching testing_config_filename should be
-            #    produced in settings.MAPPROXY_CONFIG_DIR
-            conf_path = os.path.join(testing_config_dir, testing_config_filename)
-            self.assertTrue(os.path.exists(conf_path))
-            os.unlink(conf_path)
+                # --- An instance of MapProxyCacheConfig should have been created
+                self.assertEqual(MapProxyCacheConfig.objects.count(), 1)
+                mpcc = MapProxyCacheConfig.objects.first()
+                self.assertEqual(mpcc.gpkg_filepath, filepath)
+                self.assertEqual(mpcc.config_path, conf_path)
+
+                # --- A mapproxy yaml config with name matching testing_config_filename should be
+                #    produced in settings.MAPPROXY_CONFIG_DIR, referencing the config's fragment
+                self.assertTrue(os.path.exists(conf_path))
+                self.assertTrue(os.path.exists(mpcc.fragment_path))
+
+                # --- Deleting the config, even through a QuerySet, removes its fragment
+                MapProxyCacheConfig.objects.filter(id=mpcc.id).delete()
+                self.assertFalse(os.path.exists(mpcc.fragment_path))
+                with open(conf_path) as conf_file:
+                    self.assertEqual(yaml.load(conf_file)['layers'], [])
+                os.unlink(conf_path)
 
             # --- The handler should have tried to create a Link
             MockLink.objects.create.assert_called_once()
@@ -0,0 +1,109 @@
+import logging
+
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase
+from mock import patch
+
+from osgeo_importer.handlers import FieldConverterHandler
+from osgeo_importer.utils import database_schema_name, quote_ident
+
+
+class FakeFieldConverter(object):
+    """ Converts fields one at a time, failing on the fields in *failing*.
+    """
+    failing = ()
+
+    def __init__(self, connection_string):
+        self.calls = FakeFieldConverter.calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def convert_field(self, layer_name, field):
+        self.calls.append(field)
+        if field in self.failing:
+            raise ValueError(field)
+        return '{}_as_date'.format(field)
+
+
+class FakeFieldsConverter(FakeFieldConverter):
+    """ Converts fields together, rolling them all back if one of them fails.
+    """
+
+    def convert_fields(self, layer_name, fields):
+        self.calls.append(fields)
+        if set(fields) & set(self.failing):
+            raise ValueError(fields)
+        self.conversion_stats = dict((field, {'rows': 1}) for field in fields)
+        return dict((field, '{}_as_date'.format(field)) for field in fields)
+
+
+class TestFieldConverterHandler(SimpleTestCase):
+    def setUp(self):
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def convert(self, converter, fields, failing=()):
+        handler = FieldConverterHandler(None)
+        with patch.object(handler, 'field_converter', converter), patch.object(converter, 'failing', failing):
+            new_cols = handler.convert_fields_to_time('layer', fields)
+        return new_cols, converter.calls, handler.conversion_stats
+
+    def test_convert_fields_together(self):
+        new_cols, calls, stats = self.convert(FakeFieldsConverter, ['a', 'b'])
+        self.assertEqual(new_cols, {'a': 'a_as_date', 'b': 'b_as_date'})
+        self.assertEqual(calls, [['a', 'b']])
+        self.assertEqual(stats, {'a': {'rows': 1}, 'b': {'rows': 1}})
+
+    def test_convert_fields_after_rollback(self):
+        """ Checks that a field failing to convert doesn't keep the other fields from being converted.
+        """
+        new_cols, calls, stats = self.convert(FakeFieldsConverter, ['a', 'b', 'c'], failing=['b'])
+        self.assertEqual(new_cols, {'a': 'a_as_date', 'c': 'c_as_date'})
+        self.assertEqual(calls, [['a', 'b', 'c'], ['a'], ['b'], ['c']])
+        self.assertEqual(stats, {'a': {'rows': 1}, 'c': {'rows': 1}})
+
+    def test_convert_field(self):
+        new_cols, calls, stats = self.convert(FakeFieldConverter, ['a', 'b', 'c'], failing=['b'])
+        self.assertEqual(new_cols, {'a': 'a_as_date', 'c': 'c_as_date'})
+        self.assertEqual(calls, ['a', 'b', 'c'])
+        self.assertEqual(stats, {})
+
+    def test_convert_single_field_raises(self):
+        handler = FieldConverterHandler(None)
+        for converter in (FakeFieldsConverter, FakeFieldConverter):
+            with patch.object(handler, 'field_converter', converter), patch.object(converter, 'failing', ['a']):
+                self.assertRaises(ValueError, handler.convert_field_to_time, 'layer', 'a')
+
+
+class TestFieldConverterHandlerRollback(TransactionTestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.table = '{}.osgeo_importer_convert'.format(quote_ident(database_schema_name()))
+        with connections['datastore'].cursor() as cursor:
+            cursor.execute('CREATE TABLE {} (fid serial PRIMARY KEY, a varchar, b varchar)'.format(self.table))
+            cursor.execute('INSERT INTO {} (a, b) VALUES (%s, %s)'.format(self.table), ['2001-01-02', 'no date'])
+        self.addCleanup(self.drop_table)
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def drop_table(self):
+        with connections['datastore'].cursor() as cursor:
+            cursor.execute('DROP TABLE {}'.format(self.table))
+
+    def test_convert_fields_after_rollback(self):
+        """ Checks that a field dateutil can't parse is rolled back without the fields converted with it.
+        """
+        new_cols = FieldConverterHandler(None).convert_fields_to_time('osgeo_importer_convert', ['a', 'b'])
+        self.assertEqual(new_cols, {'a': 'a_as_date'})
+
+        with connections['datastore'].cursor() as cursor:
+            cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name = "
+                           "'osgeo_importer_convert' AND column_name LIKE '%%_as_date'")
+            self.assertEqual(cursor.fetchall(), [('a_as_date',)])
+            cursor.execute("SELECT to_char(a_as_date, 'YYYY-MM-DD') FROM {}".format(self.table))
+            self.assertEqual(cursor.fetchone(), ('2001-01-02',))
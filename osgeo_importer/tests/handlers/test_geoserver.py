@@ -7,7 +7,7 @@ import logging
 from django.test import SimpleTestCase
 from geoserver.catalog import FailedRequestError
 
-from osgeo_importer.handlers.geoserver import ensure_workspace_exists, GeoserverPublishHandler
+from osgeo_importer.handlers.geoserver import ensure_workspace_exists, CatalogSession, GeoserverPublishHandler
 
 
 class TestHandlerFunctions(SimpleTestCase):
@@ -32,6 +32,34 @@ class TestHandlerFunctions(SimpleTestCase):
         gs_catalog.delete(ws2)
 
 
+class FakeCatalog(object):
+    def __init__(self):
+        self.fetched = []
+        self._cache = {}
+
+    def get_layer(self, name):
+        self.fetched.append(name)
+        return {'name': name}
+
+
+class TestCatalogSession(SimpleTestCase):
+
+    def test_layers_shared_until_invalidated(self):
+        catalog = FakeCatalog()
+        catalog._cache = {'http://geoserver/rest/layers/roads.xml': None,
+                          'http://geoserver/rest/layers/roads_2.xml': None}
+        session = CatalogSession(catalog)
+
+        self.assertEqual(session.get_layer('roads'), session.get_layer('roads'))
+        self.assertEqual(catalog.fetched, ['roads'])
+
+        session.invalidate('roads')
+        self.assertEqual(list(catalog._cache), ['http://geoserver/rest/layers/roads_2.xml'])
+        session.get_layer('roads')
+        session.get_layer('roads', refresh=True)
+        self.assertEqual(catalog.fetched, ['roads'] * 3)
+
+
 class TestGeoserverPublishHandler(SimpleTestCase):
 
     def test_get_or_create_datastore(self):
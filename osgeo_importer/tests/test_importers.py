@@ -1,17 +1,151 @@
 import os
 import shutil
+import tempfile
 
 from django.contrib.auth import get_user_model
 from django.db import connections
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
+from mock import Mock, patch
+import ogr
 
+from osgeo_importer import importers
 from osgeo_importer.importers import OGRImport
 from osgeo_importer.tests.test_settings import _TEST_FILES_DIR
-from osgeo_importer.utils import ImportHelper
+from osgeo_importer.utils import ImportHelper, get_shapefile_encoding
 
 User = get_user_model()
 
 
+class FakeLayer(object):
+    def __init__(self, feature_count, fast=True):
+        self.feature_count = feature_count
+        self.fast = fast
+
+    def TestCapability(self, capability):
+        return self.fast
+
+    def GetFeatureCount(self):
+        return self.feature_count
+
+
+class OGRImportSourceLayerTests(SimpleTestCase):
+    def test_get_source_layer_by_table_name(self):
+        """ Checks that GeoPackage layers are opened by table name, their index may not follow GDAL's layer order.
+        """
+        data = Mock()
+        OGRImport.get_source_layer(data, {'table_name': u'notes', 'index': 0})
+        data.GetLayerByName.assert_called_once_with('notes')
+        self.assertFalse(data.GetLayer.called)
+
+    def test_get_source_layer_by_index(self):
+        data = Mock()
+        OGRImport.get_source_layer(data, {'index': 1})
+        data.GetLayer.assert_called_once_with(1)
+
+
+@patch.object(importers, 'IMPORT_PARTITION_MIN_FEATURES', 10)
+@patch.object(importers, 'IMPORT_PARTITION_WORKERS', 3)
+class OGRImportPartitionTests(SimpleTestCase):
+    def setUp(self):
+        self.importer = OGRImport('test.shp', target_store='PG:')
+
+    def test_partitions_cover_layer(self):
+        """ Checks that partitions split a layer into contiguous ranges, the last one reading to its end.
+        """
+        partitions = self.importer.get_partitions(FakeLayer(11))
+        self.assertEqual(partitions, [{'start': 0, 'count': 4, 'features_read': 0},
+                                      {'start': 4, 'count': 4, 'features_read': 4},
+                                      {'start': 8, 'count': None, 'features_read': 8}])
+        self.assertEqual([importers.get_partition_end(p) for p in partitions], [4, 8, None])
+
+    def test_partitions_of_evenly_divided_layer(self):
+        partitions = self.importer.get_partitions(FakeLayer(12))
+        self.assertEqual([(p['start'], p['count']) for p in partitions], [(0, 4), (4, 4), (8, None)])
+
+    def test_partitions_fewer_than_workers(self):
+        """ Checks that a layer too small to give every worker a feature isn't split into empty partitions.
+        """
+        with patch.object(importers, 'IMPORT_PARTITION_WORKERS', 8):
+            partitions = self.importer.get_partitions(FakeLayer(10))
+        self.assertEqual([(p['start'], p['count']) for p in partitions],
+                         [(0, 2), (2, 2), (4, 2), (6, 2), (8, None)])
+
+    def test_no_partitions(self):
+        self.assertIsNone(self.importer.get_partitions(FakeLayer(9)))
+        self.assertIsNone(self.importer.get_partitions(FakeLayer(100, fast=False)))
+        with patch.object(importers, 'IMPORT_PARTITION_WORKERS', 1):
+            self.assertIsNone(self.importer.get_partitions(FakeLayer(100)))
+
+    def test_partition_slots(self):
+        """ Checks that imports share IMPORT_PARTITION_MAX_WORKERS slots.
+        """
+        lock_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, lock_dir)
+        with patch.object(importers, 'IMPORT_PARTITION_LOCK_DIR', lock_dir), \
+                patch.object(importers, 'IMPORT_PARTITION_MAX_WORKERS', 3):
+            with importers.partition_slots(2) as workers:
+                self.assertEqual(workers, 2)
+                with importers.partition_slots(2) as more_workers:
+                    self.assertEqual(more_workers, 1)
+            with importers.partition_slots(5) as workers:
+                self.assertEqual(workers, 3)
+
+
+class OGRImportEncodingTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.importer = OGRImport(os.path.join(self.directory, 'cafes.shp'), target_store='PG:')
+        self.importer.target_writer = 'osgeo_importer.writers.OGRFeatureWriter'
+
+    def create_shapefile(self, encoding):
+        """ Writes a Shapefile with the name u'Caf\xe9' in *encoding*, which is declared in its .cpg file.
+        """
+        source = ogr.GetDriverByName('ESRI Shapefile').CreateDataSource(self.importer.file)
+        layer = source.CreateLayer('cafes', geom_type=ogr.wkbPoint, options=['ENCODING={}'.format(encoding)])
+        layer.CreateField(ogr.FieldDefn('name', ogr.OFTString))
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField('name', u'Caf\xe9'.encode('utf-8'))
+        feature.SetGeometry(ogr.CreateGeometryFromWkt('POINT (1 2)'))
+        layer.CreateFeature(feature)
+        source = None
+        with open(os.path.join(self.directory, 'cafes.cpg'), 'w') as cpg:
+            cpg.write(encoding)
+
+    def copy_names(self, layer_options):
+        data, _ = self.importer.open_source_datastore(self.importer.file)
+        layer = data.GetLayer(0)
+        target = ogr.GetDriverByName('Memory').CreateDataSource('')
+        target_layer = target.CreateLayer('cafes', geom_type=ogr.wkbPoint)
+        target_layer.CreateField(ogr.FieldDefn('name', ogr.OFTString))
+
+        self.importer.copy_features(layer, target_layer, target, layer_options, None)
+        return [feature.GetField('name') for feature in target_layer]
+
+    def test_gdal_recodes_shapefile(self):
+        """ Checks that GDAL recodes a Shapefile from the encoding of its .cpg file, so fields aren't decoded again.
+        """
+        self.create_shapefile('ISO-8859-1')
+        self.assertEqual(get_shapefile_encoding(self.importer.file), 'iso8859-1')
+
+        with patch.object(OGRImport, 'decode_fields') as decode_fields:
+            names = self.copy_names({'encoding': 'iso8859-1', 'batch_size': 0})
+        self.assertEqual(names, [u'Caf\xe9'.encode('utf-8')])
+        self.assertFalse(decode_fields.called)
+
+    def test_decode_fields(self):
+        layer = ogr.GetDriverByName('Memory').CreateDataSource('').CreateLayer('cafes')
+        layer.CreateField(ogr.FieldDefn('name', ogr.OFTString))
+        layer.CreateField(ogr.FieldDefn('city', ogr.OFTString))
+        feature = ogr.Feature(layer.GetLayerDefn())
+        feature.SetField('name', u'Caf\xe9'.encode('cp1252'))
+        feature.SetField('city', 'Paris')
+
+        self.importer.decode_fields(feature, [0, 1], 'cp1252')
+        self.assertEqual(feature.GetField('name'), u'Caf\xe9'.encode('utf-8'))
+        self.assertEqual(feature.GetField('city'), 'Paris')
+
+
 class OGRImportTests(ImportHelper, TestCase,):
     def setUp(self):
         self.admin_user = User.objects.create_superuser(username='admin', password='admin', email='')
@@ -167,3 +301,80 @@ class OGRImportTests(ImportHelper, TestCase,):
             cursor.execute(sql)
             tables = [row[0] for row in cursor.fetchall()]
             self.assertIn(expected_tablename, tables)
+
+    def upload_test_file(self, test_filename):
+        """ Uploads and configures a copy of a test file, returning its UploadFile and first UploadLayer.
+        """
+        tmppath = os.path.join('/tmp', test_filename)
+        shutil.copyfile(os.path.join(_TEST_FILES_DIR, test_filename), tmppath)
+        of = open(tmppath, 'rb')
+        of.close()
+        upload = self.upload([of], self.admin_user)
+        self.configure_upload(upload, [of])
+        upload_file = upload.uploadfile_set.first()
+        return upload_file, upload_file.uploadlayer_set.first()
+
+    def test_import_file_resumes_from_checkpoint(self):
+        """ Checks that an import failing after a batch was committed but before its checkpoint was saved resumes
+            without duplicating the rows of that batch, which keep the FIDs of the GeoPackage.
+        """
+        upload_file, upload_layer = self.upload_test_file('my_states.gpkg')
+        source = ogr.Open(upload_file.file.path)
+        feature_count = source.GetLayer(0).GetFeatureCount()
+        source = None
+        self.assertGreater(feature_count, 10)
+
+        configuration_options = {'upload_layer_id': upload_layer.id, 'index': 0, 'batch_size': 5}
+        save_checkpoint = OGRImport.save_checkpoint
+        saved = []
+
+        def fail_on_third_batch(importer, *args, **kwargs):
+            # The first checkpoint is saved before the table is created.
+            if len(saved) == 3:
+                raise RuntimeError('worker lost')
+            saved.append(importer.features_read)
+            return save_checkpoint(importer, *args, **kwargs)
+
+        with patch.object(OGRImport, 'save_checkpoint', fail_on_third_batch):
+            oi = OGRImport(upload_file.file.name, upload_file=upload_file)
+            self.assertRaises(RuntimeError, oi.import_file, configuration_options=dict(configuration_options))
+
+        upload_layer.refresh_from_db()
+        self.assertEqual(upload_layer.import_checkpoint['features_read'], 10)
+
+        oi = OGRImport(upload_file.file.name, upload_file=upload_file)
+        oi.import_file(configuration_options=dict(configuration_options))
+
+        upload_layer.refresh_from_db()
+        self.assertIsNone(upload_layer.import_checkpoint)
+        with connections['datastore'].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*), COUNT(DISTINCT fid) FROM {}'.format(upload_layer.layer_name))
+            self.assertEqual(cursor.fetchone(), (feature_count, feature_count))
+
+    def test_import_file_in_partitions(self):
+        """ Checks that a layer copied in partitions keeps the FIDs of the source once, and that the FID sequence
+            of the table continues after them.
+        """
+        upload_file, upload_layer = self.upload_test_file('boxes_with_year_field.zip')
+        data, _ = OGRImport(upload_file.file.name).open_source_datastore(upload_file.file.name)
+        source_fids = [feature.GetFID() for feature in data.GetLayer(0)]
+        data = None
+        self.assertGreater(len(source_fids), 2)
+
+        configuration_options = {'upload_layer_id': upload_layer.id, 'index': 0, 'batch_size': 2}
+        # Without free worker slots the partitions are copied in this process, inside the test's transaction.
+        with patch.object(importers, 'IMPORT_PARTITION_WORKERS', 3), \
+                patch.object(importers, 'IMPORT_PARTITION_MIN_FEATURES', 1), \
+                patch.object(importers, 'IMPORT_PARTITION_MAX_WORKERS', 0), \
+                patch.object(OGRImport, 'copy_features', autospec=True, side_effect=OGRImport.copy_features) as copy:
+            oi = OGRImport(upload_file.file.name, upload_file=upload_file)
+            oi.import_file(configuration_options=configuration_options)
+
+        self.assertEqual(copy.call_count, 3)
+        upload_layer.refresh_from_db()
+        self.assertIsNone(upload_layer.import_checkpoint)
+        with connections['datastore'].cursor() as cursor:
+            cursor.execute('SELECT fid FROM {} ORDER BY fid'.format(upload_layer.layer_name))
+            self.assertEqual([row[0] for row in cursor.fetchall()], source_fids)
+            cursor.execute('INSERT INTO {} DEFAULT VALUES RETURNING fid'.format(upload_layer.layer_name))
+            self.assertGreater(cursor.fetchone()[0], max(source_fids))
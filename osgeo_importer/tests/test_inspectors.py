@@ -1,7 +1,18 @@
-from django.test import SimpleTestCase
-from osgeo_importer.inspectors import OGRInspector, GDALInspector
-from osgeo_importer.utils import NoDataSourceFound
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TransactionTestCase
+from mock import patch
+from osgeo_importer.importers import OGRImport
+from osgeo_importer.inspectors import (
+    OGRInspector, GDALInspector, OGRFieldConverter, estimate_feature_count, invalidate_describe_cache,
+    update_from_lookups
+)
+from osgeo_importer.utils import NoDataSourceFound, database_schema_name, quote_ident
 import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import zipfile
 
 
 def check_inspector_open_bad_connection(test_case, InspectorClass):
@@ -18,6 +29,70 @@ def check_inspector_open_bad_connection(test_case, InspectorClass):
     logging.disable(logging.NOTSET)
 
 
+class FakeFeature(object):
+    def ExportToJson(self):
+        return ' ' * 100
+
+
+class FakeLayer(object):
+    def __init__(self, feature_count, fast_count=False, cached_count=False):
+        self.feature_count = feature_count
+        self.fast_count = fast_count
+        self.cached_count = cached_count
+        self.read = 0
+
+    def TestCapability(self, capability):
+        return self.fast_count
+
+    def GetFeatureCount(self, force=1):
+        return self.feature_count if force or self.cached_count else -1
+
+    def ResetReading(self):
+        self.read = 0
+
+    def GetNextFeature(self):
+        if self.read < self.feature_count:
+            self.read += 1
+            return FakeFeature()
+
+
+class TestEstimateFeatureCount(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # Holds about 500 of the fake features.
+        self.filename = os.path.join(directory, 'features.json')
+        with open(self.filename, 'w') as f:
+            f.write(' ' * 50000)
+
+    def test_counted_layers(self):
+        self.assertEqual(estimate_feature_count(FakeLayer(1000, fast_count=True), self.filename, 2), (1000, False))
+        self.assertEqual(estimate_feature_count(FakeLayer(1000, cached_count=True), self.filename, 2), (1000, False))
+        self.assertEqual(estimate_feature_count(FakeLayer(5), self.filename, 2, sample_size=10), (5, False))
+
+    def test_estimated_layers(self):
+        self.assertEqual(estimate_feature_count(FakeLayer(1000), self.filename, sample_size=10), (500, True))
+        self.assertEqual(estimate_feature_count(FakeLayer(1000), '/vsimem/features.json', sample_size=10),
+                         (None, True))
+
+    def test_layers_sharing_a_file_arent_estimated(self):
+        """ Checks that the size of a file holding several layers isn't taken for the size of one of them.
+        """
+        self.assertEqual(estimate_feature_count(FakeLayer(1000), self.filename, 2, sample_size=10), (None, True))
+
+    def test_archives_arent_estimated(self):
+        """ Checks that the size of a compressed file isn't taken for the size of its features.
+        """
+        kmz = os.path.join(os.path.dirname(self.filename), 'features.kmz')
+        with zipfile.ZipFile(kmz, 'w') as archive:
+            archive.write(self.filename, 'doc.kml')
+        gz = os.path.join(os.path.dirname(self.filename), 'features.json.gz')
+        shutil.copyfile(self.filename, gz)
+
+        for filename in (kmz, gz):
+            self.assertEqual(estimate_feature_count(FakeLayer(1000), filename, sample_size=10), (None, True))
+
+
 class TestOGRInspector(SimpleTestCase):
     def test_open_bad_connection(self):
         check_inspector_open_bad_connection(self, OGRInspector)
@@ -26,3 +101,126 @@ class TestOGRInspector(SimpleTestCase):
 class TestGDALInspector(SimpleTestCase):
     def test_open_bad_connection(self):
         check_inspector_open_bad_connection(self, GDALInspector)
+
+    def test_describe_fields_cached(self):
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, 'point.geojson')
+        with open(filename, 'w') as f:
+            f.write('{"type": "FeatureCollection", "features": [{"type": "Feature", "properties": {"name": "a"}, '
+                    '"geometry": {"type": "Point", "coordinates": [1, 2]}}]}')
+
+        try:
+            invalidate_describe_cache(filename)
+            description = GDALInspector(filename).describe_fields()
+            self.assertEqual(description[0]['fields'], [{'name': 'name', 'type': 'String'}])
+
+            # Cached descriptions don't open the file with GDAL.
+            with patch.object(GDALInspector, '_describe_fields') as describe, \
+                    patch('osgeo_importer.inspectors.gdal.OpenEx') as open_ex:
+                with GDALInspector(filename) as inspector:
+                    self.assertEqual(inspector.describe_fields(), description)
+                    self.assertEqual(inspector.file_type(), 'GeoJSON')
+                self.assertFalse(describe.called)
+                self.assertFalse(open_ex.called)
+
+                invalidate_describe_cache(filename)
+                GDALInspector(filename).describe_fields()
+                self.assertTrue(describe.called)
+        finally:
+            invalidate_describe_cache(filename)
+            shutil.rmtree(directory)
+
+    def test_describe_gpkg(self):
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, 'package.gpkg')
+        conn = sqlite3.connect(filename)
+        conn.executescript("""
+        CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT, srs_id INTEGER PRIMARY KEY, organization TEXT,
+                                           organization_coordsys_id INTEGER, definition TEXT);
+        CREATE TABLE gpkg_contents (table_name TEXT PRIMARY KEY, data_type TEXT, identifier TEXT,
+                                    min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER);
+        CREATE TABLE gpkg_geometry_columns (table_name TEXT, column_name TEXT, geometry_type_name TEXT,
+                                            srs_id INTEGER, z TINYINT, m TINYINT);
+        CREATE TABLE gpkg_tile_matrix_set (table_name TEXT PRIMARY KEY, srs_id INTEGER);
+        CREATE TABLE points (fid INTEGER PRIMARY KEY, geom POINT, name TEXT(20), count MEDIUMINT, day DATE);
+        CREATE TABLE rtree_points_geom (id INTEGER, minx REAL, maxx REAL, miny REAL, maxy REAL);
+        CREATE TABLE notes (fid INTEGER PRIMARY KEY, body TEXT);
+        CREATE TABLE imagery (id INTEGER PRIMARY KEY, tile_data BLOB);
+        INSERT INTO gpkg_spatial_ref_sys VALUES ('WGS 84', 4326, 'epsg', 4326, '');
+        INSERT INTO gpkg_contents VALUES ('notes', 'attributes', 'notes', NULL, NULL, NULL, NULL, NULL);
+        INSERT INTO gpkg_contents VALUES ('points', 'features', 'points', NULL, NULL, NULL, NULL, 4326);
+        INSERT INTO gpkg_contents VALUES ('imagery', 'tiles', 'imagery', -180, -90, 180, 90, 4326);
+        INSERT INTO gpkg_geometry_columns VALUES ('points', 'geom', 'POINT', 4326, 0, 0);
+        INSERT INTO gpkg_tile_matrix_set VALUES ('imagery', 4326);
+        INSERT INTO points VALUES (1, NULL, 'a', 1, '2000-01-01'), (2, NULL, 'b', 2, '2000-01-02');
+        INSERT INTO rtree_points_geom VALUES (1, 1, 2, 3, 4), (2, -1, 0, 5, 6);
+        """)
+        conn.close()
+        # Describing a package doesn't need to write to it.
+        os.chmod(filename, 0o444)
+        with open(filename, 'rb') as f:
+            content = f.read()
+
+        try:
+            points, notes, imagery = GDALInspector(filename).describe_gpkg()
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(), content)
+            self.assertEqual(points['table_name'], 'points')
+            self.assertEqual(points['geom_type'], 'Point')
+            self.assertEqual(points['feature_count'], 2)
+            self.assertEqual(points['bbox'], [-1, 3, 2, 6])
+            self.assertEqual(points['srs'], 'EPSG:4326')
+            self.assertEqual(points['fields'], [{'name': 'name', 'type': 'String'},
+                                                {'name': 'count', 'type': 'Integer'},
+                                                {'name': 'day', 'type': 'Date'}])
+            self.assertEqual((notes['index'], notes['geom_type'], notes['feature_count']), (1, 'None', 0))
+            self.assertEqual((imagery['layer_type'], imagery['layer_name']), ('tile', 'imagery'))
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestOGRFieldConverter(TransactionTestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.table = '{}.osgeo_importer_dates'.format(quote_ident(database_schema_name()))
+        with connections['datastore'].cursor() as cursor:
+            cursor.execute('CREATE TABLE {} (fid serial PRIMARY KEY, a varchar, b varchar)'.format(self.table))
+            cursor.execute('INSERT INTO {} (a, b) VALUES (%s, %s), (%s, %s), (%s, %s)'.format(self.table), [
+                '2001-01-02', '05/06/2007', 'Jan 2nd 2001', None, None, '2001-01-02T03:04:05'])
+        self.addCleanup(self.drop_table)
+
+    def drop_table(self):
+        with connections['datastore'].cursor() as cursor:
+            cursor.execute('DROP TABLE {}'.format(self.table))
+
+    def select(self, columns):
+        with connections['datastore'].cursor() as cursor:
+            cursor.execute('SELECT {} FROM {} ORDER BY fid'.format(', '.join(columns), self.table))
+            return cursor.fetchall()
+
+    def test_convert_fields(self):
+        """ Checks that values PostgreSQL can't parse are parsed with dateutil, month first.
+        """
+        with OGRFieldConverter(OGRImport('').target_store) as datasource:
+            new_cols = datasource.convert_fields('osgeo_importer_dates', ['a', 'b'])
+
+        self.assertEqual(new_cols, {'a': 'a_as_date', 'b': 'b_as_date'})
+        self.assertEqual(self.select(["to_char({}, 'YYYY-MM-DD HH24:MI:SS')".format(column)
+                                      for column in ('a_as_date', 'b_as_date')]),
+                         [('2001-01-02 00:00:00', '2007-05-06 00:00:00'), ('2001-01-02 00:00:00', None),
+                          (None, '2001-01-02 03:04:05')])
+
+    def test_update_from_lookups_skips_converted_rows(self):
+        # The lookup table is dropped on commit.
+        with transaction.atomic(using='datastore'), connections['datastore'].cursor() as cursor:
+            cursor.execute('ALTER TABLE {} ADD COLUMN c timestamp, ADD COLUMN d timestamp'.format(self.table))
+            cursor.execute("UPDATE {} SET c = '2001-01-02', d = '2007-05-06' WHERE fid = 1".format(self.table))
+            update_from_lookups(cursor, self.table, [('a', [('c', 'timestamp')]), ('b', [('d', 'timestamp')])],
+                                [{'2001-01-02': ('1999-01-01',), 'Jan 2nd 2001': ('2001-01-02',)},
+                                 {'2001-01-02T03:04:05': ('2001-01-02T03:04:05',)}])
+            self.assertEqual(cursor.rowcount, 2)
+
+        self.assertEqual(self.select(["to_char({}, 'YYYY-MM-DD HH24:MI:SS')".format(column) for column in 'cd']),
+                         [('2001-01-02 00:00:00', '2007-05-06 00:00:00'), ('2001-01-02 00:00:00', None),
+                          (None, '2001-01-02 03:04:05')])
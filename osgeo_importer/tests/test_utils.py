@@ -1,13 +1,22 @@
 import os
+import re
 import shutil
+import tempfile
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
+from mock import patch
+from osgeo import gdal, osr
 
 from geonode.layers.models import Layer
 from osgeo_importer.tests.helpers import works_with_geoserver
 from osgeo_importer.tests.test_settings import _TEST_FILES_DIR
-from osgeo_importer.utils import ImportHelper, import_all_layers
+from osgeo_importer import utils
+from osgeo_importer.utils import (
+    ImportHelper, copy_raster_windows, create_raster_like, gdal_config_options, get_gdal_encoding, get_overview_levels,
+    get_raster_import_method, get_raster_windows, get_shapefile_encoding, import_all_layers, lru_cache, timeparse,
+    timeparse_many
+)
 import logging
 
 
@@ -72,3 +81,200 @@ class ImportUtilityTests(ImportHelper, TestCase,):
                 'Expected {} imported layers from file "{}", found {}'
                 .format(expected_layer_count, test_filename, n_imported_layers)
             )
+
+
+class EPSGIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open(os.path.join(self.directory, 'epsg_extra'), 'w') as f:
+            f.write('# Custom Mercator\n<900913> +proj=merc +a=6378137 +b=6378137 +units=m +no_defs  <>\n'
+                    '# Custom Mercator 2\n<900914> +proj=merc +a=6378137 +b=6378137 +units=m +no_defs +wktext <>\n')
+        self.cache_directory = tempfile.mkdtemp()
+        self.cache = os.path.join(self.cache_directory, 'index.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        shutil.rmtree(self.cache_directory)
+        utils._epsg_indexes.clear()
+
+    def test_find_epsg_code(self):
+        with patch.object(utils, 'EPSG_INDEX_CACHE', self.cache):
+            self.assertEqual(utils.find_epsg_code('+proj=merc +a=6378137 +b=6378137 +units=m +no_defs ',
+                                                  self.directory), '900913')
+            self.assertEqual(utils.find_epsg_code('+no_defs +wktext', self.directory), '900914')
+            self.assertIsNone(utils.find_epsg_code('+proj=utm +zone=99', self.directory))
+
+    def test_index_cached_on_disk(self):
+        with patch.object(utils, 'EPSG_INDEX_CACHE', self.cache):
+            entries = utils.build_epsg_index(self.directory)
+            self.assertEqual(len(entries), 2)
+            self.assertTrue(os.path.exists(self.cache))
+
+            # The epsg files aren't parsed again while they are unchanged.
+            with patch.object(utils, 'EPSG_LINE', re.compile('^$')):
+                self.assertEqual(utils.build_epsg_index(self.directory), entries)
+                os.utime(os.path.join(self.directory, 'epsg_extra'), (0, 0))
+                self.assertEqual(utils.build_epsg_index(self.directory), [])
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        calls = []
+
+        @lru_cache(2)
+        def double(value):
+            calls.append(value)
+            return value * 2
+
+        double(1)
+        double(2)
+        double(1)
+        double(3)
+        self.assertEqual(double(1), 2)
+        double(2)
+        self.assertEqual(calls, [1, 2, 3, 2])
+
+
+class OverviewTests(SimpleTestCase):
+    def test_get_overview_levels(self):
+        self.assertEqual(get_overview_levels(200, 100), [])
+        self.assertEqual(get_overview_levels(1000, 300), [2, 4])
+        self.assertEqual(get_overview_levels(50000, 50000), [2, 4, 8, 16, 32, 64, 128, 256])
+
+    def test_gdal_config_options(self):
+        with gdal_config_options(['COMPRESS_OVERVIEW=DEFLATE']):
+            self.assertEqual(gdal.GetConfigOption('COMPRESS_OVERVIEW'), 'DEFLATE')
+        self.assertIsNone(gdal.GetConfigOption('COMPRESS_OVERVIEW'))
+
+
+class RasterWindowTests(SimpleTestCase):
+    def test_get_raster_windows(self):
+        self.assertEqual(get_raster_windows(300, 200, 256), [(0, 0, 256, 200), (256, 0, 44, 200)])
+
+    def test_copy_raster_windows(self):
+        driver = gdal.GetDriverByName('MEM')
+        source = driver.Create('', 300, 200, 2, gdal.GDT_Byte)
+        for band in (1, 2):
+            source.GetRasterBand(band).Fill(band)
+        target = driver.Create('', 300, 200, 2, gdal.GDT_Byte)
+        progress = []
+
+        copy_raster_windows(source, target, 100, progress.append)
+        self.assertEqual(progress[-1], 1.0)
+        for band in (1, 2):
+            self.assertEqual(target.GetRasterBand(band).Checksum(), source.GetRasterBand(band).Checksum())
+
+    def test_copy_raster_windows_with_mask(self):
+        """ Checks that the scale, offset and per dataset mask of a raster are copied.
+        """
+        driver = gdal.GetDriverByName('MEM')
+        source = driver.Create('', 300, 200, 2, gdal.GDT_Int16)
+        source.GetRasterBand(1).Fill(7)
+        source.GetRasterBand(1).SetScale(0.5)
+        source.GetRasterBand(1).SetOffset(10)
+        source.CreateMaskBand(gdal.GMF_PER_DATASET)
+        mask = source.GetRasterBand(1).GetMaskBand()
+        mask.Fill(255)
+        mask.WriteRaster(0, 0, 10, 10, b'\x00' * 100)
+
+        target = create_raster_like(driver, '', source, [])
+        copy_raster_windows(source, target, 100)
+
+        band = target.GetRasterBand(1)
+        self.assertEqual((band.GetScale(), band.GetOffset()), (0.5, 10))
+        self.assertEqual(band.GetMaskFlags(), gdal.GMF_PER_DATASET)
+        self.assertEqual(band.Checksum(), source.GetRasterBand(1).Checksum())
+        self.assertEqual(band.GetMaskBand().Checksum(), mask.Checksum())
+
+
+class EncodingTests(SimpleTestCase):
+    def test_get_gdal_encoding(self):
+        self.assertEqual(get_gdal_encoding('latin-1'), 'ISO-8859-1')
+        self.assertEqual(get_gdal_encoding('iso8859_15'), 'ISO-8859-15')
+        self.assertEqual(get_gdal_encoding('cp1252'), 'CP1252')
+        self.assertEqual(get_gdal_encoding('utf8'), 'UTF-8')
+        self.assertEqual(get_gdal_encoding('euc_jp'), 'EUC-JP')
+        self.assertEqual(get_gdal_encoding('mac_roman'), 'MACINTOSH')
+
+    def test_get_shapefile_encoding(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'test.shp')
+        self.assertIsNone(get_shapefile_encoding(filename))
+
+        for cpg, encoding in [('ANSI 1252\n', 'cp1252'), ('UTF-8', 'utf-8'), ('unknown', None)]:
+            with open(os.path.join(directory, 'test.cpg'), 'w') as f:
+                f.write(cpg)
+            self.assertEqual(get_shapefile_encoding(filename), encoding)
+
+
+class RasterImportMethodTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.srs = osr.SpatialReference()
+        self.srs.ImportFromEPSG(3857)
+
+    def create_raster(self, filename, epsg=3857, options=('TILED=YES', 'COMPRESS=LZW'), geotransform=True):
+        path = os.path.join(self.tmpdir, filename) if not filename.startswith('/vsi') else filename
+        raster = gdal.GetDriverByName('GTiff').Create(path, 512, 512, 1, gdal.GDT_Byte, list(options))
+        srs = osr.SpatialReference()
+        srs.ImportFromEPSG(epsg)
+        raster.SetProjection(srs.ExportToWkt())
+        if geotransform:
+            raster.SetGeoTransform([0, 10, 0, 5120, 0, -10])
+        raster = None
+        return path
+
+    def get_method(self, path):
+        return get_raster_import_method(gdal.Open(path), 'GTiff', self.srs)
+
+    def test_copy(self):
+        self.assertEqual(self.get_method(self.create_raster('tiled.tif')), 'copy')
+
+    def test_translate(self):
+        self.assertEqual(self.get_method(self.create_raster('striped.tif', options=['COMPRESS=LZW'])), 'translate')
+        self.assertEqual(self.get_method(self.create_raster('tiled.tif', options=['TILED=YES'])), 'translate')
+
+    def test_warp(self):
+        self.assertEqual(self.get_method(self.create_raster('wgs84.tif', epsg=4326)), 'warp')
+
+    def test_translate_with_sidecar_files(self):
+        """ Checks that a GeoTIFF georeferenced by a world file isn't copied without it.
+        """
+        path = self.create_raster('world_file.tif', geotransform=False)
+        with open(os.path.join(self.tmpdir, 'world_file.tfw'), 'w') as world_file:
+            world_file.write('10\n0\n0\n-10\n5\n5115\n')
+        self.assertEqual(self.get_method(path), 'translate')
+
+    def test_translate_virtual_files(self):
+        path = self.create_raster('/vsimem/osgeo_importer_test.tif')
+        self.addCleanup(gdal.Unlink, path)
+        self.assertEqual(self.get_method(path), 'translate')
+
+
+class TimeparseTests(SimpleTestCase):
+    def test_timeparse_many(self):
+        values = ['1850', '1850 BC', '2001-01-02', 'January 2, 2001', 'not a date']
+        results = timeparse_many(values)
+        self.assertEqual(results, dict((value, timeparse(value)) for value in values))
+        self.assertEqual(results['not a date'], (None, None))
+
+    def test_timeparse_many_clean_values(self):
+        """ Checks that numpy parses strings it understands without falling back to timeparse.
+        """
+        values = ['1850', '2001-01-02', '2001-01-02T03:04:05', '2001-01-02 03:04']
+        with patch.object(utils, 'timeparse') as parse:
+            results = timeparse_many(values)
+        self.assertFalse(parse.called)
+        self.assertEqual(results, dict((value, timeparse(value)) for value in values))
+
+    def test_timeparse_many_isolates_bad_values(self):
+        """ Checks that only the strings numpy can't parse fall back to timeparse.
+        """
+        values = ['2001-01-0{}'.format(day) for day in range(1, 10)]
+        values[6:6] = ['January 2, 2001', 'not a date']
+        with patch.object(utils, 'timeparse', side_effect=timeparse) as parse:
+            results = timeparse_many(values)
+        self.assertEqual(sorted(call[0][0] for call in parse.call_args_list), ['January 2, 2001', 'not a date'])
+        self.assertEqual(results, dict((value, timeparse(value)) for value in values))
@@ -0,0 +1,211 @@
+from django.test import SimpleTestCase
+import logging
+import struct
+
+from osgeo_importer.writers import OGRFeatureWriter, PostGISCopyWriter, CopyStream, PGCOPY_ENCODERS, PGCOPY_HEADER, \
+    PGCOPY_TRAILER, wkb_to_ewkb
+
+
+class FakeFeature(object):
+    def __init__(self, fid, bad=False):
+        self.fid = fid
+        self.bad = bad
+
+    def GetFID(self):
+        return self.fid
+
+    def SetFID(self, fid):
+        self.fid = fid
+
+
+class FakeLayer(object):
+    """ Mimics the parts of an ogr.Layer used by writers, committed features end up in *features*.
+    """
+    def __init__(self, transactions=True, fail_on_commit=False):
+        self.transactions = transactions
+        # Like PostgreSQL COPY, report bad features when the transaction is committed.
+        self.fail_on_commit = fail_on_commit
+        self.features = []
+        self.pending = None
+        self.commits = 0
+        self.rollbacks = 0
+
+    def GetName(self):
+        return 'fake'
+
+    def TestCapability(self, capability):
+        return self.transactions
+
+    def StartTransaction(self):
+        self.pending = []
+
+    def CommitTransaction(self):
+        pending, self.pending = self.pending, None
+        if any(feature.bad for feature in pending):
+            raise RuntimeError('bad feature')
+        self.features.extend(pending)
+        self.commits += 1
+
+    def RollbackTransaction(self):
+        if self.pending is None:
+            raise RuntimeError('no transaction in progress')
+        self.pending = None
+        self.rollbacks += 1
+
+    def CreateFeature(self, feature):
+        # Simulate the driver assigning an id before failing.
+        feature.SetFID(999)
+        if feature.bad and not self.fail_on_commit:
+            raise RuntimeError('bad feature')
+        if self.pending is not None:
+            self.pending.append(feature)
+        else:
+            self.features.append(feature)
+
+
+class FakeRecord(object):
+    """ Mimics the field accessors of an ogr.Feature, date times are (year, month, day, hour, minute, second, tz).
+    """
+    def __init__(self, fid, values):
+        self.fid = fid
+        self.values = values
+
+    def GetFID(self):
+        return self.fid
+
+    def GetFieldCount(self):
+        return len(self.values)
+
+    def IsFieldSet(self, index):
+        return self.values[index] is not None
+
+    def GetField(self, index):
+        return self.values[index]
+
+    def GetFieldAsDateTime(self, index):
+        return self.values[index]
+
+
+class TestOGRFeatureWriter(SimpleTestCase):
+    def setUp(self):
+        logging.disable(logging.WARN)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_commits_in_batches(self):
+        layer = FakeLayer()
+        writer = OGRFeatureWriter(layer, batch_size=2)
+        for i in range(5):
+            writer.write(FakeFeature(-1))
+        self.assertEqual(len(layer.features), 4)
+        writer.close()
+        self.assertEqual(len(layer.features), 5)
+        self.assertEqual(layer.commits, 3)
+        self.assertEqual(writer.batch_count, 3)
+        self.assertEqual(writer.feature_count, 5)
+
+    def test_on_commit_after_each_batch(self):
+        layer = FakeLayer()
+        committed = []
+        writer = OGRFeatureWriter(layer, batch_size=2, on_commit=lambda: committed.append(len(layer.features)))
+        for i in range(3):
+            writer.write(FakeFeature(-1))
+        writer.close()
+        self.assertEqual(committed, [2, 3])
+
+    def test_batching_disabled(self):
+        layer = FakeLayer()
+        writer = OGRFeatureWriter(layer, batch_size=0)
+        writer.write(FakeFeature(-1))
+        self.assertEqual(len(layer.features), 1)
+        self.assertEqual(layer.commits, 0)
+
+    def test_on_commit_without_batching(self):
+        layer = FakeLayer()
+        committed = []
+        writer = OGRFeatureWriter(layer, batch_size=0, on_commit=lambda: committed.append(len(layer.features)))
+        for i in range(2):
+            writer.write(FakeFeature(-1))
+        self.assertEqual(committed, [1, 2])
+
+    def test_no_transaction_support(self):
+        layer = FakeLayer(transactions=False)
+        writer = OGRFeatureWriter(layer, batch_size=10)
+        for i in range(3):
+            writer.write(FakeFeature(-1))
+        writer.close()
+        self.assertEqual(len(layer.features), 3)
+        self.assertEqual(layer.commits, 0)
+
+    def test_failed_batch_falls_back_to_single_features(self):
+        layer = FakeLayer()
+        writer = OGRFeatureWriter(layer, batch_size=3)
+        writer.write(FakeFeature(-1))
+        writer.write(FakeFeature(-1))
+        self.assertRaises(RuntimeError, writer.write, FakeFeature(-1, bad=True))
+        # The features preceding the bad one were written individually.
+        self.assertEqual(len(layer.features), 2)
+        self.assertEqual(layer.commits, 2)
+        self.assertEqual(layer.rollbacks, 2)
+
+    def test_failed_commit_falls_back_to_single_features(self):
+        layer = FakeLayer(fail_on_commit=True)
+        writer = OGRFeatureWriter(layer, batch_size=3)
+        good = FakeFeature(-1)
+        bad = FakeFeature(-1, bad=True)
+        writer.write(good)
+        writer.write(bad)
+        self.assertRaises(RuntimeError, writer.write, FakeFeature(-1))
+        # The batch failed at commit, each feature was then committed alone up to the bad one.
+        self.assertEqual(layer.features, [good])
+        self.assertEqual(layer.commits, 1)
+        self.assertIsNone(layer.pending)
+
+
+class TestCopyHelpers(SimpleTestCase):
+    def test_wkb_to_ewkb(self):
+        point = struct.pack('<bIdd', 1, 1, 1.0, 2.0)
+        ewkb = wkb_to_ewkb(point, 4326)
+        self.assertEqual(ewkb, struct.pack('<bIIdd', 1, 0x20000001, 4326, 1.0, 2.0))
+
+        point = struct.pack('>bIdd', 0, 1001, 1.0, 2.0)
+        ewkb = wkb_to_ewkb(point, 3857)
+        self.assertEqual(ewkb, struct.pack('>bIIdd', 0, 0x20000000 + 1001, 3857, 1.0, 2.0))
+
+    def test_copy_stream(self):
+        rows = [b'a' * 10, b'b' * 10]
+        stream = CopyStream(iter(rows))
+        chunks = []
+        while True:
+            chunk = stream.read(7)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.assertEqual(b''.join(chunks), PGCOPY_HEADER + b''.join(rows) + PGCOPY_TRAILER)
+        self.assertTrue(all(len(chunk) <= 7 for chunk in chunks))
+
+    def test_encode_feature(self):
+        writer = PostGISCopyWriter(FakeLayer(), batch_size=10)
+        types = ['int4', 'float8', 'text', 'date', 'timestamp', 'timestamptz', 'timestamptz', 'int8']
+        writer.columns = [(str(i), PGCOPY_ENCODERS[name], i) for i, name in enumerate(types)]
+        writer.geometry_column = None
+        writer.write_fids = True
+        # 10:30 at GMT+2, OGR's time zone flag is 100 + the offset in 15 minute increments.
+        timestamp = (2000, 1, 2, 10, 30, 0, 108)
+        naive = (2000, 1, 2, 10, 30, 0, 0)
+        record = FakeRecord(7, [3, 1.5, u'caf\xe9', (2000, 1, 3, 0, 0, 0, 0), timestamp, timestamp, naive, None])
+
+        day = 24 * 3600 * 1000000
+        values = [struct.pack('>q', 7), struct.pack('>i', 3), struct.pack('>d', 1.5), b'caf\xc3\xa9',
+                  struct.pack('>i', 2),
+                  # timestamp without time zone keeps the wall time, timestamptz is stored as UTC.
+                  struct.pack('>q', day + (10 * 60 + 30) * 60000000),
+                  struct.pack('>q', day + (8 * 60 + 30) * 60000000),
+                  struct.pack('>q', day + (10 * 60 + 30) * 60000000)]
+        expected = struct.pack('>h', 9) + b''.join(struct.pack('>i', len(value)) + value for value in values)
+        expected += struct.pack('>i', -1)
+
+        row = writer.encode_feature(record)
+        self.assertEqual(row, expected)
+        self.assertEqual(CopyStream(iter([row])).read(), PGCOPY_HEADER + expected + PGCOPY_TRAILER)
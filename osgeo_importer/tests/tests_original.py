@@ -269,6 +269,9 @@ class UploaderTests(ImportHelper, TestCase):
                     url = '/importer-api/data-layers/{0}/'.format(upload_layer.id)
                     response = client.get(url, content_type='application/json')
                     self.assertEqual(response.status_code, 200)
+                    layer_data = json.loads(response.content)
+                    self.assertIn('import_progress', layer_data)
+                    self.assertNotIn('import_checkpoint', layer_data)
 
         return content
 
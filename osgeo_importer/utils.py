@@ -1,12 +1,17 @@
+import codecs
 from cStringIO import StringIO
 import collections
+from contextlib import contextmanager
 from datetime import datetime
 import errno
+import functools
+import json
 import logging
 import os
 import re
 import shutil
 import sys
+import tempfile
 from urlparse import urlparse
 import uuid
 
@@ -33,6 +38,23 @@ except ImportError:
 ogr.UseExceptions()
 gdal.UseExceptions()
 
+# On-disk copy of the proj4 -> EPSG index built from PROJECTION_DIRECTORY, None to rebuild it in every process.
+EPSG_INDEX_CACHE = getattr(settings, 'OSGEO_IMPORTER_EPSG_INDEX_CACHE',
+                           os.path.join(tempfile.gettempdir(), 'osgeo_importer_epsg_index.json'))
+WKT_EPSG_CACHE_SIZE = getattr(settings, 'OSGEO_IMPORTER_WKT_EPSG_CACHE_SIZE', 256)
+# Format of imported rasters, 'GTiff' or 'COG' (Cloud Optimized GeoTIFF, needs GDAL >= 3.1).
+RASTER_FORMAT = getattr(settings, 'OSGEO_IMPORTER_RASTER_FORMAT', 'GTiff')
+COG_OPTIONS = getattr(settings, 'OSGEO_IMPORTER_COG_OPTIONS',
+                      ['COMPRESS=DEFLATE', 'PREDICTOR=YES', 'BLOCKSIZE=512', 'OVERVIEWS=AUTO', 'RESAMPLING=AVERAGE',
+                       'NUM_THREADS=ALL_CPUS'])
+# Memory (bytes) a raster import may use, split between GDAL's block cache and the warp buffer.  Size it from the
+# worker's memory divided by the number of imports it runs concurrently.
+RASTER_MEMORY = getattr(settings, 'OSGEO_IMPORTER_RASTER_MEMORY', 1024 * 1024 * 1024)
+# Threads used to warp and compress rasters, a number or ALL_CPUS.
+RASTER_THREADS = getattr(settings, 'OSGEO_IMPORTER_RASTER_THREADS', 'ALL_CPUS')
+# Width and height in pixels of the windows rasters are warped and written in.
+RASTER_WINDOW_SIZE = getattr(settings, 'OSGEO_IMPORTER_RASTER_WINDOW_SIZE', 4096)
+
 GDAL_GEOMETRY_TYPES = {
     0: 'Unknown',
     1: 'Point',
@@ -54,9 +76,10 @@ GDAL_GEOMETRY_TYPES = {
 }
 
 
-def timeparse(timestr):
-    import numpy
-    DEFAULT = datetime(1, 1, 1)
+def normalize_timestr(timestr):
+    """
+    Rewrites BC/AD dates as signed years, returning the string and whether it is BC.
+    """
     bc = False
     if re.search(r'bce?', timestr, flags=re.I):
         bc = True
@@ -70,7 +93,13 @@ def timeparse(timestr):
     if bc is True:
         timestr = "-%s" % timestr
 
-    timestr = timestr.strip()
+    return timestr.strip(), bc
+
+
+def timeparse(timestr):
+    import numpy
+    DEFAULT = datetime(1, 1, 1)
+    timestr, bc = normalize_timestr(timestr)
 
     try:
         t = numpy.datetime64(timestr).astype('datetime64[ms]').astype('int64')
@@ -92,6 +121,40 @@ def timeparse(timestr):
     return None, None
 
 
+def timeparse_many(timestrs):
+    """
+    Parses distinct strings like timeparse, returning {string: (milliseconds, iso string)}.  The strings are
+    parsed by numpy in arrays, an array holding a string numpy can't parse is halved until that string is on its
+    own, so timeparse only parses the strings numpy can't.
+    """
+    import numpy
+    results = {}
+    timestrs = list(timestrs)
+    normalized = [normalize_timestr(timestr)[0] for timestr in timestrs]
+    nat = numpy.iinfo('int64').min
+    chunks = [(0, len(timestrs))]
+
+    while chunks:
+        start, end = chunks.pop()
+        try:
+            times = numpy.array(normalized[start:end], dtype='datetime64[ms]')
+        except ValueError:
+            if end - start > 1:
+                middle = (start + end) // 2
+                chunks.extend([(middle, end), (start, middle)])
+            continue
+
+        for timestr, t in zip(timestrs[start:end], times.astype('int64')):
+            if t != nat:
+                results[timestr] = (t, str(numpy.datetime64(t, 'ms')))
+
+    for timestr in timestrs:
+        if timestr not in results:
+            results[timestr] = timeparse(timestr)
+
+    return results
+
+
 def ensure_defaults(layer):
     """
     Sets a geoserver feature type defaults.
@@ -246,24 +309,78 @@ def increment_filename(filename):
         return filename
 
 
+def is_self_contained_raster(indata):
+    """
+    Returns True if *indata* is a local file holding its own georeferencing, so the file can be copied on its own.
+    Rasters read from /vsi paths or subdatasets, or with sidecar files (.tfw, .prj, .aux.xml, .ovr, ...) that GDAL
+    reads their SRS, geotransform or overviews from, aren't.
+    """
+    path = indata.GetDescription()
+    if not os.path.isfile(path):
+        return False
+
+    files = indata.GetFileList() or []
+    if [os.path.realpath(f) for f in files] != [os.path.realpath(path)]:
+        return False
+
+    return bool(indata.GetProjectionRef()) and indata.GetGeoTransform(can_return_null=True) is not None
+
+
+def get_raster_import_method(indata, raster_format, srs):
+    """
+    Returns how raster_import produces a raster in *srs* from *indata*:
+    'copy' if it is already a tiled, compressed, self-contained GeoTIFF in *srs*, 'translate' if it only needs
+    re-encoding and 'warp' if it has to be reprojected.  Rasters that are translated or warped (through a warped
+    VRT) are written window by window with create_raster_like and copy_raster_windows, or with the COG driver's
+    CreateCopy when writing COGs; gdal.Translate isn't used.
+    """
+    source_srs = osr.SpatialReference(wkt=indata.GetProjectionRef())
+    geotransform = indata.GetGeoTransform()
+
+    # Rotated grids are warped north up.
+    if not source_srs.IsSame(srs) or geotransform[2] or geotransform[4]:
+        return 'warp'
+
+    block_width, _ = indata.GetRasterBand(1).GetBlockSize()
+    if raster_format == 'GTiff' and indata.GetDriver().ShortName == 'GTiff' and block_width < indata.RasterXSize \
+            and indata.GetMetadataItem('COMPRESSION', 'IMAGE_STRUCTURE') and is_self_contained_raster(indata):
+        return 'copy'
+
+    return 'translate'
+
+
 def raster_import(infile, outfile, *args, **kwargs):
+    """
+    Writes *infile* in EPSG:3857 to *outfile*, reprojecting, re-encoding or copying it as needed.  If the
+    *layer_options* kwarg is given, the method used is recorded in its 'raster_import_method', a *progress* kwarg
+    is called with the fraction of pixels written.
+    """
     if os.path.exists(outfile):
         raise FileExists
 
-    options = get_kwarg('options', kwargs, ['TILED=YES', 'COMPRESS=LZW', 'NUM_THREADS=4'])
-    gdal.SetCacheMax = 524288000
+    raster_format = get_kwarg('raster_format', kwargs, RASTER_FORMAT)
+    if raster_format == 'COG' and gdal.GetDriverByName('COG') is None:
+        logger.warn('GDAL {} has no COG driver, writing a GeoTIFF instead.'.format(gdal.__version__))
+        raster_format = 'GTiff'
+
+    build_overviews = get_kwarg('build_overviews', kwargs, True)
+    if raster_format == 'COG':
+        # The COG driver writes the tiles and their internal overviews, in range-readable order, in one CreateCopy.
+        options = get_kwarg('options', kwargs, COG_OPTIONS)
+        if not build_overviews:
+            options = options + ['OVERVIEWS=NONE']
+        build_overviews = False
+    else:
+        options = get_kwarg('options', kwargs, ['TILED=YES', 'COMPRESS=LZW', 'NUM_THREADS={}'.format(RASTER_THREADS)])
+
+    memory = get_kwarg('raster_memory', kwargs, RASTER_MEMORY)
+    gdal.SetCacheMax(memory // 2)
     sr = osr.SpatialReference()
     sr.ImportFromEPSG(3857)
     t_srs_prj = sr.ExportToWkt()
-    build_overviews = get_kwarg('build_overviews', kwargs, True)
-
-    # gdal.WarpOptions(
-    #     multithread=True,
-    #     warpMemoryLimit=524288000
-    # )
 
-    geotiff = gdal.GetDriverByName("GTiff")
-    if geotiff is None:
+    driver = gdal.GetDriverByName(raster_format)
+    if driver is None:
         raise RuntimeError
 
     indata = gdal.Open(infile)
@@ -273,25 +390,202 @@ def raster_import(infile, outfile, *args, **kwargs):
     if indata.GetProjectionRef() is None:
         indata.SetProjection(t_srs_prj)
 
-    vrt = gdal.AutoCreateWarpedVRT(indata, None, t_srs_prj, 0, .125)
-    outdata = geotiff.CreateCopy(outfile, vrt, 0, options)
+    warp_options = dict(dstSRS=t_srs_prj, errorThreshold=.125, multithread=True, warpMemoryLimit=memory // 2,
+                        warpOptions=['NUM_THREADS={}'.format(RASTER_THREADS)])
+    method = get_raster_import_method(indata, raster_format, sr)
+    logger.info('Importing raster "{}" to "{}" ({}).'.format(infile, outfile, method))
+
+    progress = kwargs.get('progress')
+
+    if method == 'copy':
+        indata = None
+        shutil.copyfile(infile, outfile)
+        outdata = gdal.Open(outfile)
+        # Keep the overviews the source came with.
+        if outdata.GetRasterBand(1).GetOverviewCount():
+            build_overviews = False
+        if progress:
+            progress(1.0)
+    else:
+        if method == 'warp':
+            # Pixels are warped as they are read from the VRT, one window at a time.
+            indata = gdal.Warp('', indata, options=gdal.WarpOptions(format='VRT', **warp_options))
+
+        if raster_format == 'COG':
+            # COG can only be written by CreateCopy, which streams the VRT in one pass.
+            outdata = driver.CreateCopy(outfile, indata, 0, options, callback=gdal_progress_callback(progress))
+        else:
+            outdata = create_raster_like(driver, outfile, indata, options)
+            copy_raster_windows(indata, outdata, get_kwarg('window_size', kwargs, RASTER_WINDOW_SIZE), progress)
     outdata = None
     indata = None
 
+    if 'layer_options' in kwargs:
+        kwargs['layer_options']['raster_import_method'] = method
+
     if build_overviews:
-        overviews_levels = get_kwarg('overviews_levels', kwargs, [2, 4, 8, 16, 32])
+        overviews_levels = get_kwarg('overviews_levels', kwargs, None)
         overviews_resampling = get_kwarg('overviews_resampling', kwargs, 'AVERAGE')
         overviews_options = get_kwarg('overviews_options', kwargs, ['COMPRESS_OVERVIEW=LZW'])
+        build_raster_overviews(outfile, overviews_resampling, overviews_levels, overviews_options)
 
-        for opt in overviews_options:
-            key, value = opt.split('=')
-            gdal.SetConfigOption(key, value)
+    return outfile
 
-        ds = gdal.Open(outfile)
-        ds.BuildOverviews(overviews_resampling, overviews_levels)
-        ds = None
 
-    return outfile
+def gdal_progress_callback(progress):
+    """
+    Adapts a progress(fraction) function to a GDAL progress callback.
+    """
+    if progress is None:
+        return
+
+    def callback(complete, message, data):
+        progress(complete)
+        return 1
+    return callback
+
+
+def get_mask_flags(band):
+    """
+    Returns the flags of the mask band a copy of *band* needs, or None if its mask is all valid or comes from its
+    nodata value or an alpha band, which are copied with the pixels.
+    """
+    flags = band.GetMaskFlags()
+    if flags & (gdal.GMF_ALL_VALID | gdal.GMF_NODATA | gdal.GMF_ALPHA):
+        return None
+    return flags
+
+
+def create_raster_like(driver, filename, source, options):
+    """
+    Creates an empty raster with the size, bands and georeferencing of *source*, and its band's nodata values,
+    color tables, scales, offsets and mask bands.
+    """
+    options = list(options)
+    interpretations = [source.GetRasterBand(i).GetColorInterpretation() for i in range(1, source.RasterCount + 1)]
+    if interpretations[:3] == [gdal.GCI_RedBand, gdal.GCI_GreenBand, gdal.GCI_BlueBand] and \
+            not any(option.upper().startswith('PHOTOMETRIC=') for option in options):
+        options.append('PHOTOMETRIC=RGB')
+    if interpretations[-1] == gdal.GCI_AlphaBand:
+        options.append('ALPHA=YES')
+
+    band = source.GetRasterBand(1)
+    target = driver.Create(filename, source.RasterXSize, source.RasterYSize, source.RasterCount, band.DataType,
+                           options)
+    target.SetGeoTransform(source.GetGeoTransform())
+    target.SetProjection(source.GetProjectionRef())
+
+    for i in range(1, source.RasterCount + 1):
+        source_band = source.GetRasterBand(i)
+        target_band = target.GetRasterBand(i)
+        nodata = source_band.GetNoDataValue()
+        if nodata is not None:
+            target_band.SetNoDataValue(nodata)
+        if source_band.GetColorTable():
+            target_band.SetColorTable(source_band.GetColorTable())
+        target_band.SetColorInterpretation(interpretations[i - 1])
+        if source_band.GetScale() is not None:
+            target_band.SetScale(source_band.GetScale())
+        if source_band.GetOffset() is not None:
+            target_band.SetOffset(source_band.GetOffset())
+
+        mask_flags = get_mask_flags(source_band)
+        if mask_flags is None:
+            continue
+        if not mask_flags & gdal.GMF_PER_DATASET:
+            target_band.CreateMaskBand(mask_flags)
+        elif i == 1:
+            target.CreateMaskBand(gdal.GMF_PER_DATASET)
+
+    return target
+
+
+def get_raster_windows(width, height, window_size):
+    """
+    Returns the (x offset, y offset, width, height) windows covering a raster, row by row.
+    """
+    return [(x, y, min(window_size, width - x), min(window_size, height - y))
+            for y in range(0, height, window_size) for x in range(0, width, window_size)]
+
+
+def copy_raster_windows(source, target, window_size=None, progress=None):
+    """
+    Copies the pixels of *source* to *target* one window of window_size x window_size pixels at a time (rounded to
+    the target's block size), so memory use doesn't grow with the raster.  Every band of a window is read at once,
+    as are the mask bands create_raster_like gave *target*.  progress(fraction) is called after each window.
+    """
+    target_band = target.GetRasterBand(1)
+    block_width, _ = target_band.GetBlockSize()
+    window_size = max((window_size or RASTER_WINDOW_SIZE) // block_width, 1) * block_width
+    windows = get_raster_windows(source.RasterXSize, source.RasterYSize, window_size)
+
+    masks = [(source.GetRasterBand(band).GetMaskBand(), target.GetRasterBand(band).GetMaskBand())
+             for band in range(1, source.RasterCount + 1) if get_mask_flags(target.GetRasterBand(band)) is not None]
+    # The bands share a per dataset mask.
+    if masks and target_band.GetMaskFlags() & gdal.GMF_PER_DATASET:
+        masks = masks[:1]
+
+    for i, (x, y, width, height) in enumerate(windows):
+        # Reading all the bands in one dataset level request lets GDAL read pixel interleaved sources block by block.
+        data = source.ReadRaster(x, y, width, height, buf_type=target_band.DataType)
+        target.WriteRaster(x, y, width, height, data, buf_type=target_band.DataType)
+
+        for source_mask, target_mask in masks:
+            target_mask.WriteRaster(x, y, width, height, source_mask.ReadRaster(x, y, width, height))
+
+        if progress:
+            progress(float(i + 1) / len(windows))
+
+
+@contextmanager
+def gdal_config_options(options):
+    """
+    Sets GDAL config options (['KEY=VALUE', ...]) for the current thread only, restoring them on exit.
+    """
+    set_option = getattr(gdal, 'SetThreadLocalConfigOption', gdal.SetConfigOption)
+    get_option = getattr(gdal, 'GetThreadLocalConfigOption', gdal.GetConfigOption)
+    previous = []
+
+    for option in options:
+        key, value = option.split('=', 1)
+        previous.append((key, get_option(key)))
+        set_option(key, value)
+
+    try:
+        yield
+    finally:
+        for key, value in reversed(previous):
+            set_option(key, value)
+
+
+def get_overview_levels(width, height, min_size=256):
+    """
+    Returns the overview factors (2, 4, 8, ...) needed until the smallest overview fits in *min_size* pixels.
+    """
+    levels = []
+    level = 2
+    while max(width, height) / float(level // 2) > min_size:
+        levels.append(level)
+        level *= 2
+    return levels
+
+
+def build_raster_overviews(filename, resampling='AVERAGE', levels=None, options=None):
+    """
+    Builds the overviews of a raster, with levels derived from its size unless given.  The config *options* only
+    apply to this build, GDAL_NUM_THREADS lets GDAL compute overview blocks concurrently (GDAL >= 3.2).
+    """
+    options = ['GDAL_NUM_THREADS={}'.format(RASTER_THREADS)] + list(options or [])
+    ds = gdal.Open(filename)
+
+    if levels is None:
+        levels = get_overview_levels(ds.RasterXSize, ds.RasterYSize)
+
+    if levels:
+        with gdal_config_options(options):
+            ds.BuildOverviews(resampling, levels)
+
+    ds = None
 
 
 def quote_ident(str):
@@ -314,6 +608,52 @@ def decode(s, encodings=('ascii', 'utf8', 'latin1')):
     return s.decode('ascii', 'ignore')
 
 
+def get_shapefile_encoding(filename):
+    """
+    Returns the Python codec name declared in the .cpg file of a Shapefile, or None if there isn't a usable one.
+    """
+    cpg_file = '{}.cpg'.format(os.path.splitext(filename)[0])
+
+    if not os.path.isfile(cpg_file):
+        return
+
+    with open(cpg_file) as f:
+        encoding = f.read().strip()
+
+    parts = encoding.split()
+    if len(parts) > 1:
+        # attempt to cover a case where encoding
+        # is similar to ANSI 1252 (cp1252)
+        encoding = 'cp{}'.format(parts[-1])
+
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return
+
+
+# Python codecs iconv, which GDAL recodes text with, doesn't know by their uppercased names.
+GDAL_ENCODINGS = {
+    'hz': 'HZ-GB-2312',
+    'iso2022_jp': 'ISO-2022-JP',
+    'iso2022_kr': 'ISO-2022-KR',
+    'mac-roman': 'MACINTOSH',
+    'utf-16-be': 'UTF-16BE',
+    'utf-16-le': 'UTF-16LE',
+}
+
+
+def get_gdal_encoding(encoding):
+    """
+    Returns the name GDAL knows the Python codec *encoding* by, e.g. ISO-8859-1 for iso8859-1 or CP1252 for cp1252.
+    """
+    name = codecs.lookup(encoding).name
+    if name in GDAL_ENCODINGS:
+        return GDAL_ENCODINGS[name]
+
+    return re.sub(r'^ISO8859-', 'ISO-8859-', name.upper().replace('_', '-'))
+
+
 class ImportHelper(object):
     """
     Import Helpers
@@ -511,6 +851,7 @@ class ImportHelper(object):
 
         # Loop through and create uploadfiles and uploadlayers
         upfiles = []
+        estimated_layers = []
 
         styles = [os.path.basename(x) for x in finalfiles if '.sld' in x.lower()]
         for each in finalfiles:
@@ -576,10 +917,13 @@ class ImportHelper(object):
                             fields=ignore_invalid_chars(fields),
                             index=layer_desc.get('index'),
                             feature_count=layer_desc.get('feature_count', None),
+                            feature_count_estimated=layer_desc.get('feature_count_estimated', False),
                             configuration_options=configuration_options
                         )
                         # If we wait for upload.save(), we may introduce layer_name collisions.
                         upload_layer.save()
+                    if upload_layer.feature_count_estimated:
+                        estimated_layers.append(upload_layer.id)
                        
                     upload.uploadlayer_set.add(upload_layer)
 
@@ -587,6 +931,12 @@ class ImportHelper(object):
         upload.state = 'UPLOADED'
         upload.save()
 
+        # Count the features of layers whose count was estimated outside of the request.
+        if estimated_layers:
+            from osgeo_importer.tasks import count_features
+            for upload_layer_id in estimated_layers:
+                count_features.delay(upload_layer_id)
+
 
 def import_all_layers(uploaded_data, owner=None):
     """ Imports all layers of *uploaded_data*.
@@ -625,6 +975,100 @@ def import_all_layers(uploaded_data, owner=None):
     return len(import_results)
 
 
+def lru_cache(maxsize):
+    """
+    Memoizes the results of a function of hashable arguments, keeping the *maxsize* most recently used.
+    Exceptions aren't cached.
+    """
+    def decorator(function):
+        cache = collections.OrderedDict()
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            try:
+                result = cache.pop(key)
+            except KeyError:
+                result = function(*args, **kwargs)
+                if len(cache) >= maxsize:
+                    cache.popitem(last=False)
+            cache[key] = result
+            return result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
+
+
+EPSG_LINE = re.compile(r'<(\d+)>\s*(.*?)\s*(?:<>)?\s*$')
+_epsg_indexes = {}
+
+
+def build_epsg_index(epsg_directory):
+    """
+    Reads the (proj4, code) definitions of the proj.4 epsg files in *epsg_directory*, reusing the copy in
+    EPSG_INDEX_CACHE while the files are unchanged.
+    """
+    files = sorted(name for name in os.listdir(epsg_directory) if os.path.isfile(os.path.join(epsg_directory, name)))
+    signature = [[name, os.path.getmtime(os.path.join(epsg_directory, name)),
+                  os.path.getsize(os.path.join(epsg_directory, name))] for name in files]
+
+    if EPSG_INDEX_CACHE and os.path.exists(EPSG_INDEX_CACHE):
+        try:
+            with open(EPSG_INDEX_CACHE) as f:
+                cached = json.load(f)
+            if cached['directory'] == epsg_directory and cached['signature'] == signature:
+                return [tuple(entry) for entry in cached['entries']]
+        except (IOError, ValueError, KeyError) as e:
+            logger.warn('Ignoring EPSG index cache {}: {}'.format(EPSG_INDEX_CACHE, e))
+
+    entries = []
+    for name in files:
+        with open(os.path.join(epsg_directory, name)) as f:
+            for line in f:
+                match = EPSG_LINE.search(line)
+                if match:
+                    entries.append((match.group(2), match.group(1)))
+
+    if EPSG_INDEX_CACHE:
+        # Write a copy and rename it, so concurrent workers never read a partial file.
+        try:
+            fd, path = tempfile.mkstemp(dir=os.path.dirname(EPSG_INDEX_CACHE))
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'directory': epsg_directory, 'signature': signature, 'entries': entries}, f)
+            os.rename(path, EPSG_INDEX_CACHE)
+        except (IOError, OSError) as e:
+            logger.warn('Could not write EPSG index cache {}: {}'.format(EPSG_INDEX_CACHE, e))
+
+    return entries
+
+
+def get_epsg_index(epsg_directory):
+    """
+    Returns the ({proj4: code}, [(proj4, code), ...]) index of *epsg_directory*, built once per process.
+    """
+    if epsg_directory not in _epsg_indexes:
+        entries = build_epsg_index(epsg_directory)
+        codes = {}
+        for proj4, code in entries:
+            codes.setdefault(proj4, code)
+        _epsg_indexes[epsg_directory] = (codes, entries)
+
+    return _epsg_indexes[epsg_directory]
+
+
+def find_epsg_code(proj4, epsg_directory):
+    """
+    Returns the code of the first definition in *epsg_directory* containing the *proj4* string, or None.
+    """
+    codes, entries = get_epsg_index(epsg_directory)
+    code = codes.get(proj4.strip())
+    if code is None:
+        code = next((code for definition, code in entries if definition.find(proj4.strip()) != -1), None)
+    return code
+
+
+@lru_cache(WKT_EPSG_CACHE_SIZE)
 def convert_wkt_to_epsg(wkt, epsg_directory=settings.PROJECTION_DIRECTORY, forceProj4=False):
     """ Transform a WKT string to an EPSG code
         Arguments
@@ -635,7 +1079,6 @@ def convert_wkt_to_epsg(wkt, epsg_directory=settings.PROJECTION_DIRECTORY, force
         forceProj4: whether to perform brute force proj4 epsg file check (last resort).
         Returns: EPSG code.
     """
-    epsg_code = None
     srs_in = osr.SpatialReference()
 
     if srs_in.ImportFromWkt(wkt) == 5:  # Invalid WKT
@@ -662,14 +1105,7 @@ def convert_wkt_to_epsg(wkt, epsg_directory=settings.PROJECTION_DIRECTORY, force
         if forceProj4 is True:
             return projection_out
 
-        for file in os.listdir(epsg_directory):
-            file_open = open(epsg_directory + file)
-            for line in file_open:
-                if line.find(projection_out) != -1:
-                    match = re.search('<(\\d+)>', line)
-                    if match:
-                        epsg_code = match.group(1)
-                        break
+        epsg_code = find_epsg_code(projection_out, epsg_directory)
         if epsg_code:  # Match
             return 'EPSG:%s' % epsg_code
         else:  # No match
@@ -682,102 +1118,6 @@ def convert_wkt_to_epsg(wkt, epsg_directory=settings.PROJECTION_DIRECTORY, force
         raise Exception(msg)
 
 
-def reproject_coordinate_system(original_layer_name, layer_name, in_shp_layer, layer_path):
-    def get_geometry_type(geometry_name):
-        switcher = {
-            "POINT": ogr.wkbPoint,
-            "MULTIPOINT": ogr.wkbMultiPoint,
-            "LINESTRING": ogr.wkbLineString,
-            "MULTILINESTRING": ogr.wkbMultiLineString,
-            "POLYGON": ogr.wkbPolygon,
-            "MULTIPOLYGON": ogr.wkbMultiPolygon
-        }
-        return switcher.get(geometry_name)
-
-    shp_driver = ogr.GetDriverByName('ESRI Shapefile')
-
-    # input SpatialReference
-    input_srs = in_shp_layer.GetSpatialRef()
-
-    # output SpatialReference
-    output_srs = osr.SpatialReference()
-    output_srs.ImportFromEPSG(4326)
-
-    # create the CoordinateTransformation
-    coord_trans = osr.CoordinateTransformation(input_srs, output_srs)
-
-    # create the output layer
-    output_shp_file = '{}/{}_reproj.shp'.format(layer_path, layer_name)
-
-    # check if output file exists if yes delete it
-    if os.path.exists(output_shp_file):
-        shp_driver.DeleteDataSource(output_shp_file)
-
-    # create a new Shapefile object
-    output_shp_dataset = shp_driver.CreateDataSource(output_shp_file)
-
-    # create a new layer in output Shapefile and define its geometry type
-    feature = in_shp_layer.GetNextFeature()
-    geometry = feature.GetGeometryRef()
-    geometry_type = get_geometry_type(geometry.GetGeometryName())
-    output_shp_layer = output_shp_dataset.CreateLayer('{}_4326'.format(layer_name), output_srs, geometry_type)
-    in_shp_layer.ResetReading()
-
-    # add fields to the new output Shapefile
-    # get list of attribute fields
-    # create new fields for output
-    in_layer_def = in_shp_layer.GetLayerDefn()
-    for i in range(0, in_layer_def.GetFieldCount()):
-        field_def = in_layer_def.GetFieldDefn(i)
-        output_shp_layer.CreateField(field_def)
-
-    # get the output layer's feature definition
-    output_layer_def = output_shp_layer.GetLayerDefn()
-
-    # loop through the input features
-    in_feature = in_shp_layer.GetNextFeature()
-    while in_feature:
-        # get the input geometry
-        geom = in_feature.GetGeometryRef()
-        # reproject the geometry
-        geom.Transform(coord_trans)
-        # create a new feature
-        output_feature = ogr.Feature(output_layer_def)
-        # set the geometry and attribute
-        output_feature.SetGeometry(geom)
-        for i in range(0, output_layer_def.GetFieldCount()):
-            output_feature.SetField(output_layer_def.GetFieldDefn(i).GetNameRef(), in_feature.GetField(i))
-        # add the feature to the shapefile
-        output_shp_layer.CreateFeature(output_feature)
-        # destroy the features and get the next input feature
-        output_feature.Destroy()
-        in_feature.Destroy()
-        in_feature = in_shp_layer.GetNextFeature()
-
-    # close the shapefiles
-    output_shp_dataset.Destroy()
-
-    spatialRef = osr.SpatialReference()
-    spatialRef.ImportFromEPSG(4326)
-
-    spatialRef.MorphToESRI()
-    prj_file = open('{}/{}_reproj.prj'.format(layer_path, layer_name), 'w')
-    prj_file.write(spatialRef.ExportToWkt())
-    prj_file.close()
-
-    for file_name in os.listdir(layer_path):
-        if os.path.splitext(file_name)[0] == original_layer_name:
-            os.remove(os.path.join(layer_path, file_name))
-
-    for file_name in os.listdir(layer_path):
-        if os.path.splitext(file_name)[0] == '{}_reproj'.format(layer_name):
-            extension = os.path.splitext(file_name)[1][1:].strip().lower()
-            os.rename(os.path.join(layer_path, file_name),
-                      os.path.join(layer_path, '{}.{}'.format(original_layer_name, extension)))
-
-    return '{0}:{1}'.format(output_srs.GetAuthorityName(None), output_srs.GetAuthorityCode(None))
-
-
 def database_schema_name():
     db_settings = db.connections[settings.OSGEO_DATASTORE].settings_dict
     schema = 'public'
@@ -0,0 +1,438 @@
+from datetime import date, datetime, timedelta
+from logging import getLogger
+import struct
+import time
+
+from django import db
+from django.conf import settings
+import ogr
+
+from osgeo_importer.utils import database_schema_name, quote_ident
+
+
+ogr.UseExceptions()
+logger = getLogger(__name__)
+
+OSGEO_WRITER = getattr(settings, 'OSGEO_IMPORTER_TARGET_WRITER', 'osgeo_importer.writers.OGRFeatureWriter')
+# Number of features written per transaction, 0 (or None) writes each feature in its own implicit transaction.
+IMPORT_BATCH_SIZE = getattr(settings, 'OSGEO_IMPORTER_BATCH_SIZE', 20000)
+
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('>h', -1)
+# PostgreSQL stores dates and timestamps relative to 2000-01-01.
+PG_EPOCH = datetime(2000, 1, 1)
+EWKB_SRID_FLAG = 0x20000000
+
+
+class FeatureWriterMixin(object):
+    """
+    Writers copy features, one batch at a time, into a target layer.
+    """
+
+    def __init__(self, target_layer, batch_size=IMPORT_BATCH_SIZE, target_datastore=None, on_commit=None,
+                 *args, **kwargs):
+        self.target_layer = target_layer
+        self.target_datastore = target_datastore
+        # Called after each batch (or unbatched feature) has been committed, e.g. to checkpoint the import.
+        self.on_commit = on_commit
+        self.batch_size = batch_size or 0
+        self.batch = []
+        self.batch_count = 0
+        self.feature_count = 0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Only commit the pending batch if the copy loop finished cleanly.
+        if exc_type is None:
+            self.close()
+
+    def write(self, feature):
+        """
+        Queues a feature, writing the pending batch once it reaches batch_size.
+        """
+        if self.batch_size <= 1:
+            self.write_feature(feature)
+            self.feature_count += 1
+            if self.on_commit:
+                self.on_commit()
+            return
+
+        # Keep the FID the feature was handed over with, the driver may overwrite it on a failed attempt.
+        self.batch.append((feature, feature.GetFID()))
+
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the pending batch, falling back to writing its features one at a time if the batch fails.
+        """
+        if not self.batch:
+            return
+
+        features = [feature for feature, _ in self.batch]
+        start = time.time()
+
+        try:
+            self.write_batch(features)
+        except Exception as e:
+            logger.warn('Batch {} of layer "{}" failed ({}), retrying it one feature at a time.'.format(
+                self.batch_count + 1, self.target_layer.GetName(), str(e)))
+            for feature, fid in self.batch:
+                feature.SetFID(fid)
+            self.write_features(features)
+
+        elapsed = time.time() - start
+        self.batch_count += 1
+        self.feature_count += len(features)
+        self.elapsed += elapsed
+        logger.info('Batch {}: wrote {} features to "{}" in {:.2f}s ({:.0f} features/s).'.format(
+            self.batch_count, len(features), self.target_layer.GetName(), elapsed,
+            len(features) / elapsed if elapsed else float(len(features))))
+        self.batch = []
+
+        if self.on_commit:
+            self.on_commit()
+
+    def close(self):
+        """
+        Writes any pending features and logs the overall throughput.
+        """
+        self.flush()
+
+        if self.batch_count > 1:
+            logger.info('Wrote {} features to "{}" in {} batches, {:.2f}s ({:.0f} features/s).'.format(
+                self.feature_count, self.target_layer.GetName(), self.batch_count, self.elapsed,
+                self.feature_count / self.elapsed if self.elapsed else float(self.feature_count)))
+
+    def finalize(self):
+        """
+        Called once after every partition of a layer has been written by a separate writer.
+        """
+        pass
+
+    def write_batch(self, features):
+        """
+        Writes a list of features as a single unit, raising if any of them could not be written.
+        """
+        raise NotImplementedError
+
+    def write_features(self, features):
+        """
+        Writes a list of features individually, used when a batch fails so the offending feature is reported.
+        """
+        raise NotImplementedError
+
+    def write_feature(self, feature):
+        """
+        Writes a single feature when batching is disabled.
+        """
+        self.write_features([feature])
+
+
+class OGRFeatureWriter(FeatureWriterMixin):
+    """
+    Writes features with OGR, wrapping each batch in an explicit transaction when the target supports it.
+    """
+
+    def write_batch(self, features):
+        if not self.target_layer.TestCapability(ogr.OLCTransactions):
+            return self.write_features(features)
+
+        # The commit stays in the try, drivers writing with COPY (PG_USE_COPY) only report bad rows when it ends.
+        self.target_layer.StartTransaction()
+        try:
+            for feature in features:
+                self.target_layer.CreateFeature(feature)
+            self.target_layer.CommitTransaction()
+        except Exception:
+            self.rollback()
+            raise
+
+    def write_features(self, features):
+        if not self.target_layer.TestCapability(ogr.OLCTransactions):
+            for feature in features:
+                self.target_layer.CreateFeature(feature)
+            return
+
+        # Commit each feature so an error deferred to the commit is raised for the feature that caused it.
+        for feature in features:
+            self.target_layer.StartTransaction()
+            try:
+                self.target_layer.CreateFeature(feature)
+                self.target_layer.CommitTransaction()
+            except Exception:
+                self.rollback()
+                raise
+
+    def write_feature(self, feature):
+        self.target_layer.CreateFeature(feature)
+
+    def rollback(self):
+        """
+        Rolls back the current transaction, a failed commit may already have ended it.
+        """
+        try:
+            self.target_layer.RollbackTransaction()
+        except Exception as e:
+            logger.debug('Rollback of "{}" failed: {}'.format(self.target_layer.GetName(), str(e)))
+
+    def finalize(self):
+        # Each partition moves the FID sequence past the FIDs it wrote, the last one to do so may not have seen
+        # every partition's rows.
+        if self.target_datastore is not None and self.target_datastore.GetDriver().GetName() == 'PostgreSQL':
+            reset_fid_sequence(self.target_layer.GetName(), self.target_layer.GetFIDColumn())
+
+
+def reset_fid_sequence(table_name, fid_column):
+    """
+    Moves the sequence of a PostGIS table's FID column past its largest FID, writing explicit FIDs bypasses it.
+    """
+    table = '{}.{}'.format(quote_ident(database_schema_name()), quote_ident(table_name))
+
+    with db.connections[settings.OSGEO_DATASTORE].cursor() as cursor:
+        cursor.execute('SELECT setval(pg_get_serial_sequence(%s, %s), MAX({})) FROM {}'.format(
+            quote_ident(fid_column), table), (table, fid_column))
+
+
+def wkb_to_ewkb(wkb, srid):
+    """
+    Embeds *srid* into an (ISO or OGC) WKB geometry, producing the EWKB PostGIS expects for a typed column.
+    """
+    byte_order = '<' if wkb[0:1] == b'\x01' else '>'
+    geom_type, = struct.unpack(byte_order + 'I', wkb[1:5])
+    return wkb[0:1] + struct.pack(byte_order + 'II', geom_type | EWKB_SRID_FLAG, srid) + wkb[5:]
+
+
+def _datetime_value(feature, index, to_utc=False):
+    """
+    Returns the value of a date/time field as a naive datetime, converted to UTC if *to_utc* and the value has a
+    time zone.
+    """
+    year, month, day, hour, minute, second, tz_flag = feature.GetFieldAsDateTime(index)
+    value = datetime(year or 1, month or 1, day or 1, hour, minute) + timedelta(seconds=second)
+
+    # OGR encodes the time zone as 100 + the offset from GMT in 15 minute increments.
+    if to_utc and tz_flag > 1:
+        value -= timedelta(minutes=(tz_flag - 100) * 15)
+
+    return value
+
+
+def _encode_text(feature, index):
+    value = feature.GetField(index)
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return value
+
+
+def _encode_date(feature, index):
+    year, month, day = feature.GetFieldAsDateTime(index)[:3]
+    return struct.pack('>i', (date(year, month, day) - PG_EPOCH.date()).days)
+
+
+def _encode_time(feature, index):
+    hour, minute, second = feature.GetFieldAsDateTime(index)[3:6]
+    return struct.pack('>q', int(round((hour * 3600 + minute * 60 + second) * 1000000)))
+
+
+def _pack_timestamp(value):
+    delta = value - PG_EPOCH
+    return struct.pack('>q', (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def _encode_timestamp(feature, index):
+    # Like PostgreSQL does for text input, a timestamp without time zone ignores the value's offset.
+    return _pack_timestamp(_datetime_value(feature, index))
+
+
+def _encode_timestamptz(feature, index):
+    return _pack_timestamp(_datetime_value(feature, index, to_utc=True))
+
+
+def _struct_encoder(fmt):
+    def encode(feature, index):
+        return struct.pack(fmt, feature.GetField(index))
+    return encode
+
+
+# Binary COPY encoders for the column types OGR creates in PostgreSQL, keyed by pg_type.typname.
+PGCOPY_ENCODERS = {
+    'bool': _struct_encoder('>?'),
+    'int2': _struct_encoder('>h'),
+    'int4': _struct_encoder('>i'),
+    'int8': _struct_encoder('>q'),
+    'float4': _struct_encoder('>f'),
+    'float8': _struct_encoder('>d'),
+    'varchar': _encode_text,
+    'text': _encode_text,
+    'bpchar': _encode_text,
+    'json': _encode_text,
+    'bytea': lambda feature, index: feature.GetFieldAsBinary(index),
+    'date': _encode_date,
+    'time': _encode_time,
+    'timestamp': _encode_timestamp,
+    'timestamptz': _encode_timestamptz,
+}
+
+
+class CopyStream(object):
+    """
+    A read-only file-like object that lazily encodes rows for psycopg2's copy_expert.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = PGCOPY_HEADER
+        self.done = False
+
+    def read(self, size=-1):
+        while not self.done and (size < 0 or len(self.buffer) < size):
+            try:
+                self.buffer += next(self.rows)
+            except StopIteration:
+                self.buffer += PGCOPY_TRAILER
+                self.done = True
+
+        if size < 0:
+            size = len(self.buffer)
+
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+class PostGISCopyWriter(OGRFeatureWriter):
+    """
+    Streams features into a PostGIS target with binary COPY through the OSGEO_DATASTORE connection.
+
+    Only the column types in PGCOPY_ENCODERS are supported, other targets (or tables with other column types)
+    are written with OGR.  Date times without a time zone written to timestamptz columns are stored as UTC.
+    """
+
+    def __init__(self, target_layer, batch_size=IMPORT_BATCH_SIZE, target_datastore=None, on_commit=None,
+                 *args, **kwargs):
+        super(PostGISCopyWriter, self).__init__(target_layer, batch_size, target_datastore, on_commit,
+                                                *args, **kwargs)
+        self.connection = db.connections[settings.OSGEO_DATASTORE]
+        self.columns = None
+        self.write_fids = None
+        self.wrote_fids = False
+        self.copy_sql = None
+
+        if target_datastore is None or target_datastore.GetDriver().GetName() != 'PostgreSQL':
+            logger.info('Target of "{}" is not PostgreSQL, writing features with OGR.'.format(target_layer.GetName()))
+            return
+
+        # OGR defers creating the table until the first feature is written, force it so COPY has a target.
+        target_layer.SyncToDisk()
+        self.table = '{}.{}'.format(quote_ident(database_schema_name()), quote_ident(target_layer.GetName()))
+        self.columns = self.get_columns()
+
+    def get_columns(self):
+        """
+        Returns (column, encoder, source field index) for each target column, or None if a column
+        can't be encoded.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT a.attname, t.typname
+                FROM pg_attribute a JOIN pg_type t ON a.atttypid = t.oid
+                WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+            """, (self.table,))
+            column_types = dict(cursor.fetchall())
+
+        layer_definition = self.target_layer.GetLayerDefn()
+        self.fid_column = self.target_layer.GetFIDColumn()
+        self.geometry_column = self.target_layer.GetGeometryColumn()
+        self.srid = None
+        columns = []
+
+        # OGR's CreateFeature maps fields by position, do the same.
+        for i in range(layer_definition.GetFieldCount()):
+            name = layer_definition.GetFieldDefn(i).GetName()
+            encoder = PGCOPY_ENCODERS.get(column_types.get(name))
+
+            if encoder is None:
+                logger.info('Column "{}" of "{}" has type "{}" which COPY does not support, writing with OGR.'.format(
+                    name, self.table, column_types.get(name)))
+                return
+
+            columns.append((name, encoder, i))
+
+        if self.geometry_column:
+            with self.connection.cursor() as cursor:
+                cursor.execute('SELECT Find_SRID(%s, %s, %s)',
+                               (database_schema_name(), self.target_layer.GetName(), self.geometry_column))
+                self.srid = cursor.fetchone()[0]
+
+        return columns
+
+    def get_copy_sql(self):
+        column_names = [name for name, _, _ in self.columns]
+        if self.geometry_column:
+            column_names.insert(0, self.geometry_column)
+        if self.write_fids:
+            column_names.insert(0, self.fid_column)
+
+        return 'COPY {} ({}) FROM STDIN WITH (FORMAT binary)'.format(
+            self.table, ', '.join(quote_ident(name) for name in column_names))
+
+    def encode_feature(self, feature):
+        """
+        Returns a feature as a binary COPY tuple.
+        """
+        values = []
+
+        if self.write_fids:
+            values.append(struct.pack('>q', feature.GetFID()))
+
+        if self.geometry_column:
+            geometry = feature.GetGeometryRef()
+            values.append(wkb_to_ewkb(geometry.ExportToIsoWkb(), self.srid) if geometry else None)
+
+        for _, encoder, index in self.columns:
+            if index < feature.GetFieldCount() and feature.IsFieldSet(index) and feature.GetField(index) is not None:
+                values.append(encoder(feature, index))
+            else:
+                values.append(None)
+
+        row = [struct.pack('>h', len(values))]
+        for value in values:
+            if value is None:
+                row.append(struct.pack('>i', -1))
+            else:
+                row.append(struct.pack('>i', len(value)) + value)
+
+        return b''.join(row)
+
+    def write_batch(self, features):
+        if self.columns is None:
+            return super(PostGISCopyWriter, self).write_batch(features)
+
+        # Features either all carry the source FID or all leave it to the table's sequence.
+        if self.write_fids is None:
+            self.write_fids = features[0].GetFID() != ogr.NullFID
+            self.copy_sql = self.get_copy_sql()
+        if any((feature.GetFID() != ogr.NullFID) != self.write_fids for feature in features):
+            raise ValueError('Cannot COPY a mix of features with and without a FID.')
+
+        stream = CopyStream(self.encode_feature(feature) for feature in features)
+
+        with db.transaction.atomic(using=settings.OSGEO_DATASTORE):
+            with self.connection.cursor() as cursor:
+                cursor.copy_expert(self.copy_sql, stream)
+
+        self.wrote_fids = self.wrote_fids or self.write_fids
+
+    def close(self):
+        super(PostGISCopyWriter, self).close()
+
+        # Explicit FIDs bypass the FID sequence, move it past them so later inserts don't collide.
+        if self.wrote_fids:
+            reset_fid_sequence(self.target_layer.GetName(), self.fid_column)